@@ -0,0 +1,276 @@
+"""Stage-level benchmark for embed/extract across sizes, formats and methods.
+
+    python benchmarks/bench_embed.py --sizes 256 1024 4096 --formats png jpg bmp \\
+        --methods lsb dct --output results.json
+    python benchmarks/bench_embed.py --compare baseline.json --output results.json
+
+Synthetic hosts are generated deterministically. Each case runs in a fresh
+process, so its peak RSS is measured on its own. Decode, watermark
+preparation, embed/extract and encode are timed separately (best of
+--repeat). A case that fails (out of memory, say) is recorded with its
+error and the run goes on; the exit code is then non-zero. With
+--compare, the exit code is also non-zero when a stage is slower than the
+baseline by more than --tolerance.
+"""
+import argparse
+import json
+import os
+import platform
+import resource
+import subprocess
+import sys
+import tempfile
+import time
+from concurrent.futures import ProcessPoolExecutor
+from multiprocessing import get_context
+
+import numpy as np
+from PIL import Image
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, ROOT)
+
+from digital_watermark import core, dct  # noqa: E402
+
+# 16384x16384 is over PIL's decompression-bomb limit. This runs again in
+# every spawned case process, which imports this module.
+Image.MAX_IMAGE_PIXELS = None
+
+DEFAULT_SIZES = (256, 1024, 4096)
+DEFAULT_FORMATS = ('png', 'jpg', 'bmp')
+DEFAULT_METHODS = ('lsb', 'dct')
+OPERATIONS = ('embed', 'extract')
+
+
+def synthetic_host(size, seed=0):
+    # Smooth gradients plus noise compress like a photo rather than pure noise
+    rng = np.random.default_rng(seed)
+    ramp = np.linspace(0, 255, size, dtype=np.float32)
+    pixels = np.empty((size, size, 3), dtype=np.uint8)
+    noise = rng.integers(-12, 13, (min(size, 512), min(size, 512)), dtype=np.int16)
+    reps = -(-size // noise.shape[0])
+    noise = np.tile(noise, (reps, reps))[:size, :size]
+    for channel, (a, b) in enumerate(((1.0, 0.0), (0.0, 1.0), (0.5, 0.5))):
+        base = a * ramp[:, None] + b * ramp[None, :]
+        pixels[..., channel] = np.clip(base + noise, 0, 255)
+    return pixels
+
+
+def synthetic_watermark(path, size=128):
+    y, x = np.mgrid[:size, :size]
+    pattern = (((x // 16) + (y // 16)) % 2) * 255
+    Image.fromarray(pattern.astype(np.uint8)).save(path)
+
+
+def peak_rss_mb():
+    peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    # Linux reports kilobytes, macOS bytes
+    return peak / (1024 * 1024) if sys.platform == 'darwin' else peak / 1024
+
+
+def timed(stages, name, func, *args):
+    start = time.perf_counter()
+    result = func(*args)
+    stages[name] = time.perf_counter() - start
+    return result
+
+
+def run_case(case):
+    # Runs in a fresh process; returns best-of timings per stage
+    best = {}
+    for _ in range(case['repeat']):
+        stages = _run_once(case)
+        for name, seconds in stages.items():
+            best[name] = min(seconds, best.get(name, float('inf')))
+    result = dict(case)
+    result.pop('host_path')
+    result.pop('watermark_path')
+    result.pop('marked_path')
+    result['stages'] = best
+    result['total_seconds'] = sum(best.values())
+    result['peak_rss_mb'] = peak_rss_mb()
+    return result
+
+
+def _run_once(case):
+    stages = {}
+    output = os.path.join(case['workdir'], f"out-{os.getpid()}.png")
+    method, operation = case['method'], case['operation']
+    if operation == 'embed':
+        pixels = timed(stages, 'decode', core.load_host, case['host_path'])
+        height, width = pixels.shape[:2]
+        if method == 'lsb':
+            bits = timed(stages, 'watermark', core.prepare_watermark,
+                         case['watermark_path'], (width, height))
+            result = timed(stages, 'embed', core.embed_lsb_array, pixels, bits)
+        else:
+            bits = timed(stages, 'watermark', dct.prepare_dct_watermark,
+                         case['watermark_path'], dct.block_grid(pixels))
+            result = timed(stages, 'embed', dct.embed_dct_array, pixels, bits)
+    else:
+        pixels = timed(stages, 'decode', core.load_host, case['marked_path'])
+        if method == 'lsb':
+            result = timed(stages, 'extract', core.extract_lsb_array, pixels)
+        else:
+            original = core.load_host(case['host_path'])
+            result = timed(stages, 'extract', dct.extract_dct_array, pixels, original)
+    timed(stages, 'encode', lambda: Image.fromarray(result).save(output))
+    os.remove(output)
+    return stages
+
+
+def prepare_inputs(workdir, size, fmt, method, watermark_path):
+    # The host in the requested format, plus a watermarked PNG to extract
+    # from (JPEG would destroy an LSB watermark before extraction)
+    host_path = os.path.join(workdir, f"host-{size}.{fmt}")
+    if not os.path.exists(host_path):
+        Image.fromarray(synthetic_host(size)).save(host_path)
+    marked_path = os.path.join(workdir, f"marked-{size}-{fmt}-{method}.png")
+    if method == 'lsb':
+        core.embed_lsb(host_path, watermark_path, marked_path)
+    else:
+        dct.embed_dct(host_path, watermark_path, marked_path)
+    return host_path, marked_path
+
+
+def environment():
+    try:
+        commit = subprocess.run(['git', 'rev-parse', 'HEAD'], cwd=ROOT, capture_output=True,
+                                text=True, check=True).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        commit = None
+    return {
+        'python': platform.python_version(),
+        'numpy': np.__version__,
+        'pillow': Image.__version__,
+        'platform': platform.platform(),
+        'commit': commit,
+        'timestamp': time.strftime('%Y-%m-%dT%H:%M:%S%z'),
+    }
+
+
+def case_key(result):
+    return (result['method'], result['operation'], result['format'], result['size'])
+
+
+def compare(results, baseline, tolerance):
+    # Returns human-readable regressions: stages slower than baseline * (1 + tolerance)
+    previous = {case_key(result): result for result in baseline['results']}
+    regressions = []
+    for result in results:
+        old = previous.get(case_key(result))
+        if old is None or 'error' in result or 'error' in old:
+            continue
+        for stage, seconds in result['stages'].items():
+            before = old['stages'].get(stage)
+            if before and seconds > before * (1 + tolerance):
+                regressions.append(f"{'/'.join(map(str, case_key(result)))} {stage}: "
+                                   f"{before * 1000:.1f} ms -> {seconds * 1000:.1f} ms")
+    return regressions
+
+
+def print_header():
+    print(f"{'method':6} {'op':7} {'fmt':4} {'size':>6} {'decode':>9} {'wm':>9} "
+          f"{'kernel':>9} {'encode':>9} {'total':>9} {'RSS MB':>8}")
+
+
+def print_row(r):
+    stages = r['stages']
+    kernel = stages.get('embed', stages.get('extract', 0.0))
+    print(f"{r['method']:6} {r['operation']:7} {r['format']:4} {r['size']:>6} "
+          f"{stages['decode'] * 1000:>7.1f}ms {stages.get('watermark', 0.0) * 1000:>7.1f}ms "
+          f"{kernel * 1000:>7.1f}ms {stages['encode'] * 1000:>7.1f}ms "
+          f"{r['total_seconds'] * 1000:>7.1f}ms {r['peak_rss_mb']:>8.1f}")
+
+
+def print_failure(case, error):
+    print(f"{case['method']:6} {case['operation']:7} {case['format']:4} {case['size']:>6} "
+          f"FAILED: {error}")
+
+
+def failed_case(case, error):
+    result = {key: case[key] for key in ('method', 'operation', 'format', 'size')}
+    result['error'] = f"{type(error).__name__}: {error}"
+    return result
+
+
+def run_isolated(case):
+    # A fresh pool per case: a worker killed for running out of memory
+    # breaks its pool, and must not take the later cases with it
+    try:
+        with ProcessPoolExecutor(max_workers=1, mp_context=get_context('spawn')) as pool:
+            return pool.submit(run_case, case).result()
+    except Exception as e:
+        return failed_case(case, e)
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('--sizes', type=int, nargs='+', default=list(DEFAULT_SIZES),
+                        help='Square host sizes in pixels (up to 16384)')
+    parser.add_argument('--formats', nargs='+', default=list(DEFAULT_FORMATS),
+                        choices=DEFAULT_FORMATS)
+    parser.add_argument('--methods', nargs='+', default=list(DEFAULT_METHODS),
+                        choices=DEFAULT_METHODS)
+    parser.add_argument('--operations', nargs='+', default=list(OPERATIONS), choices=OPERATIONS)
+    parser.add_argument('--repeat', type=int, default=3)
+    parser.add_argument('--workdir', help='Where to keep generated images (default: temp dir)')
+    parser.add_argument('--output', help='Write results as JSON to this file')
+    parser.add_argument('--compare', help='Baseline JSON from an earlier run')
+    parser.add_argument('--tolerance', type=float, default=0.25,
+                        help='Allowed slowdown per stage before failing (default: 0.25)')
+    args = parser.parse_args(argv)
+
+    with tempfile.TemporaryDirectory() as tmp:
+        workdir = args.workdir or tmp
+        os.makedirs(workdir, exist_ok=True)
+        watermark_path = os.path.join(workdir, 'watermark.png')
+        synthetic_watermark(watermark_path)
+
+        results = []
+        print_header()
+        # One process per case so peak RSS is not inherited from earlier cases
+        for size in args.sizes:
+            for fmt in args.formats:
+                for method in args.methods:
+                    cases = [{'method': method, 'operation': operation, 'format': fmt,
+                              'size': size, 'repeat': args.repeat, 'workdir': workdir,
+                              'watermark_path': watermark_path}
+                             for operation in args.operations]
+                    try:
+                        host_path, marked_path = prepare_inputs(workdir, size, fmt, method,
+                                                                watermark_path)
+                    except Exception as e:
+                        for case in cases:
+                            results.append(failed_case(case, e))
+                            print_failure(case, results[-1]['error'])
+                        continue
+                    for case in cases:
+                        case.update(host_path=host_path, marked_path=marked_path)
+                        results.append(run_isolated(case))
+                        if 'error' in results[-1]:
+                            print_failure(case, results[-1]['error'])
+                        else:
+                            print_row(results[-1])
+                    os.remove(marked_path)
+
+    report = {'environment': environment(), 'results': results}
+    if args.output:
+        with open(args.output, 'w') as f:
+            json.dump(report, f, indent=2)
+
+    failed = sum('error' in result for result in results)
+    if failed:
+        print(f"{failed} case(s) failed")
+    if args.compare:
+        with open(args.compare) as f:
+            regressions = compare(results, json.load(f), args.tolerance)
+        for line in regressions:
+            print(f"REGRESSION {line}")
+        if regressions:
+            return 1
+    return 1 if failed else 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -0,0 +1,87 @@
+"""Watermark preparation and embed time for each placement mode.
+
+    python benchmarks/bench_placement.py --sizes 1024 4096 8192
+    python benchmarks/bench_placement.py --watermark logo.png --output placement.json
+
+Each placement embeds the same watermark into the same synthetic host,
+best of --repeat. 'peak MB' is the largest temporary allocation during
+preparation and embed (numpy reports its buffers to tracemalloc), so the
+full-size plane that 'stretch' builds shows up next to the others.
+"""
+import argparse
+import json
+import os
+import sys
+import tempfile
+import time
+import tracemalloc
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, ROOT)
+
+from bench_embed import environment, synthetic_host, synthetic_watermark  # noqa: E402
+from digital_watermark.core import embed_lsb_pixels  # noqa: E402
+from digital_watermark.placement import PLACEMENTS  # noqa: E402
+
+
+def run_placement(host, watermark_path, placement, repeat):
+    best = None
+    for _ in range(repeat):
+        pixels = host.copy()
+        start = time.perf_counter()
+        embed_lsb_pixels(pixels, watermark_path, placement=placement)
+        seconds = time.perf_counter() - start
+        best = seconds if best is None else min(best, seconds)
+    pixels = host.copy()
+    tracemalloc.start()
+    embed_lsb_pixels(pixels, watermark_path, placement=placement)
+    peak = tracemalloc.get_traced_memory()[1]
+    tracemalloc.stop()
+    return {'placement': placement, 'seconds': best, 'peak_bytes': peak}
+
+
+def print_header():
+    print(f"{'size':>11} {'placement':<13} {'embed':>10} {'MP/s':>8} {'peak MB':>8}")
+
+
+def print_row(label, host, r):
+    megapixels = host.shape[0] * host.shape[1] / 1e6
+    print(f"{label:>11} {r['placement']:<13} {r['seconds'] * 1000:>8.1f}ms "
+          f"{megapixels / r['seconds']:>8.1f} {r['peak_bytes'] / 1e6:>8.1f}")
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('--sizes', type=int, nargs='+', default=[1024, 4096],
+                        help='Square synthetic host sizes in pixels')
+    parser.add_argument('--watermark', help='Watermark image (default: 128x128 checkerboard)')
+    parser.add_argument('--placements', nargs='+', choices=PLACEMENTS, default=list(PLACEMENTS),
+                        metavar='PLACEMENT', help='Subset of placements to run (default: all)')
+    parser.add_argument('--repeat', type=int, default=3)
+    parser.add_argument('--output', help='Write results as JSON to this file')
+    args = parser.parse_args(argv)
+
+    results = []
+    with tempfile.TemporaryDirectory() as tmp:
+        watermark_path = args.watermark
+        if not watermark_path:
+            watermark_path = os.path.join(tmp, 'watermark.png')
+            synthetic_watermark(watermark_path)
+        print_header()
+        for size in args.sizes:
+            host = synthetic_host(size)
+            label = f"{size}x{size}"
+            for placement in args.placements:
+                result = run_placement(host, watermark_path, placement, args.repeat)
+                result['host'] = label
+                results.append(result)
+                print_row(label, host, result)
+
+    if args.output:
+        with open(args.output, 'w') as f:
+            json.dump({'environment': environment(), 'results': results}, f, indent=2)
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
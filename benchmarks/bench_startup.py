@@ -0,0 +1,126 @@
+"""Cold-start cost: import time and time to the first embed, per entry point.
+
+    python benchmarks/bench_startup.py
+    python benchmarks/bench_startup.py --repeat 10 --output startup.json
+
+Every case runs in a fresh interpreter, best of --repeat, and is reported
+as wall time and as time over a bare 'python -c pass'. The heavy modules
+each case ended up importing are listed next to it. The exit code is
+non-zero if anything other than the GUI imported Qt, or if the package
+import or --help loaded numpy or PIL.
+"""
+import argparse
+import json
+import os
+import subprocess
+import sys
+import tempfile
+import time
+
+from PIL import Image
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, ROOT)
+
+from bench_embed import environment, synthetic_host, synthetic_watermark  # noqa: E402
+
+HEAVY_MODULES = ('numpy', 'PIL', 'PyQt5', 'cv2', 'asyncio', 'multiprocessing', 'sqlite3')
+# Cases that must not load numpy or PIL at all
+LIGHT_CASES = ('python', 'import package', 'cli --help')
+
+# Appended to every case: reports which heavy modules were loaded
+REPORT = f"""
+import json as _json, sys as _sys
+_sys.stderr.write('\\nLOADED ' + _json.dumps(
+    [m for m in {HEAVY_MODULES!r} if m in _sys.modules]) + '\\n')
+"""
+
+
+def cli(*argv):
+    return ("import runpy, sys\n"
+            f"sys.argv = ['digital_watermark'] + {list(argv)!r}\n"
+            "try:\n"
+            "    runpy.run_module('digital_watermark', run_name='__main__')\n"
+            "except SystemExit:\n"
+            "    pass\n")
+
+
+def cases(host_path, watermark_path, workdir):
+    output_path = os.path.join(workdir, 'marked.png')
+    return [
+        ('python', 'pass'),
+        ('import package', 'import digital_watermark'),
+        ('import core', 'import digital_watermark.core'),
+        ('cli --help', cli('--help')),
+        ('first embed (api)', "from digital_watermark import embed_lsb\n"
+                              f"embed_lsb({host_path!r}, {watermark_path!r}, {output_path!r})"),
+        ('first embed (cli)', cli('embed', host_path, '-w', watermark_path,
+                                  '-o', os.path.join(workdir, 'cli'), '-q')),
+        ('import gui', 'import watermarking'),
+    ]
+
+
+def run_case(code, repeat):
+    env = dict(os.environ, PYTHONPATH=ROOT, QT_QPA_PLATFORM='offscreen')
+    best = None
+    loaded = []
+    for _ in range(repeat):
+        start = time.perf_counter()
+        proc = subprocess.run([sys.executable, '-c', code + REPORT], cwd=ROOT, env=env,
+                              capture_output=True, text=True)
+        seconds = time.perf_counter() - start
+        if proc.returncode != 0:
+            return None, proc.stderr.strip().splitlines()[-1:]
+        best = seconds if best is None else min(best, seconds)
+        for line in proc.stderr.splitlines():
+            if line.startswith('LOADED '):
+                loaded = json.loads(line[len('LOADED '):])
+    return best, loaded
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('--repeat', type=int, default=5)
+    parser.add_argument('--size', type=int, default=512, help='Square host size for the embeds')
+    parser.add_argument('--output', help='Write results as JSON to this file')
+    args = parser.parse_args(argv)
+
+    results = []
+    with tempfile.TemporaryDirectory() as workdir:
+        host_path = os.path.join(workdir, 'host.png')
+        watermark_path = os.path.join(workdir, 'watermark.png')
+        Image.fromarray(synthetic_host(args.size)).save(host_path)
+        synthetic_watermark(watermark_path)
+
+        print(f"{'case':<18} {'wall':>9} {'over python':>12}  loaded")
+        baseline = None
+        for label, code in cases(host_path, watermark_path, workdir):
+            seconds, loaded = run_case(code, args.repeat)
+            if seconds is None:
+                print(f"{label:<18} {'failed':>9} {'':>12}  {' '.join(loaded)}")
+                results.append({'case': label, 'seconds': None, 'error': ' '.join(loaded)})
+                continue
+            if baseline is None:
+                baseline = seconds
+            print(f"{label:<18} {seconds * 1000:>7.1f}ms {(seconds - baseline) * 1000:>10.1f}ms  "
+                  f"{', '.join(loaded) or '-'}")
+            results.append({'case': label, 'seconds': seconds,
+                            'over_python_seconds': seconds - baseline, 'loaded': loaded})
+
+    if args.output:
+        with open(args.output, 'w') as f:
+            json.dump({'environment': environment(), 'results': results}, f, indent=2)
+    # The core, CLI and workers must never pay for Qt
+    leaked = [r['case'] for r in results
+              if r['case'] != 'import gui' and 'PyQt5' in r.get('loaded', ())]
+    for label in leaked:
+        print(f"QT IMPORTED by {label}")
+    heavy = [r['case'] for r in results if r['case'] in LIGHT_CASES
+             and {'numpy', 'PIL'} & set(r.get('loaded', ()))]
+    for label in heavy:
+        print(f"NUMPY/PIL IMPORTED by {label}")
+    return 1 if leaked or heavy else 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
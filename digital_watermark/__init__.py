@@ -0,0 +1,32 @@
+"""GUI-free watermarking core used by the PyQt app, the CLI and batch workers.
+
+The names below are loaded on first access (PEP 562), so importing the
+package, or one of the light submodules digital_watermark.defaults and
+digital_watermark.methods, does not pull in numpy and PIL until something
+actually needs them.
+"""
+import importlib
+
+_LAZY = {
+    'embed_lsb': 'core',
+    'embed_lsb_array': 'core',
+    'extract_lsb': 'core',
+    'extract_lsb_array': 'core',
+    'load_host': 'core',
+    'prepare_watermark': 'core',
+}
+
+__all__ = list(_LAZY)
+
+
+def __getattr__(name):
+    module = _LAZY.get(name)
+    if module is None:
+        raise AttributeError(f"module {__name__!r} has no attribute {name!r}")
+    value = getattr(importlib.import_module(f'.{module}', __name__), name)
+    globals()[name] = value
+    return value
+
+
+def __dir__():
+    return sorted(set(globals()) | set(_LAZY))
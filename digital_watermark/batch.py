@@ -0,0 +1,367 @@
+"""Run embed or extract over many images without any GUI."""
+import csv
+import glob
+import os
+import time
+from collections import deque
+from concurrent.futures import FIRST_COMPLETED, wait
+from dataclasses import dataclass
+
+import numpy as np
+
+from .bitplane import check_watermark, extract_bitplane
+from .cache import DEFAULT_CACHE_BYTES, WatermarkCache
+from .defaults import DEFAULT_ALPHA, DEFAULT_PLACEMENT
+from .encode import check_lossless
+from .layout import Layout, embed_layered, embed_payload, extract_layered, extract_payload
+from .methods import StageTimer, get_method
+from .mmap_io import RAW_EXTENSIONS, embed_lsb_converted, embed_lsb_mapped, extract_lsb_mapped
+from .stream import embed_lsb_streaming, extract_lsb_streaming
+
+IMAGE_EXTENSIONS = ('.png', '.jpg', '.jpeg', '.bmp', '.tif', '.tiff', '.ppm', '.npy') + RAW_EXTENSIONS
+MANIFEST_EXTENSIONS = ('.txt', '.csv', '.lst')
+
+# One cache per process; pool workers each get their own via _init_worker
+watermark_cache = WatermarkCache()
+
+
+@dataclass
+class BatchJob:
+    input_path: str
+    output_path: str
+    # Unmarked host, needed to extract non-blind methods such as DCT
+    original_path: str = None
+
+
+@dataclass
+class JobOptions:
+    # mode: 'decode' (full decode via PIL), 'streaming' (row strips) or
+    # 'mmap' (modify uncompressed files in place through numpy.memmap).
+    # .npy and headerless raw inputs always use 'mmap' unless streaming;
+    # embedding them into another format reads them through the map instead.
+    mode: str = 'decode'
+    strip_rows: int = None
+    raw_shape: tuple = None
+    # extract: save the packed LSB plane (.npz with 'bits' and 'width')
+    # instead of encoding an image
+    packed: bool = False
+    # A name from the method registry ('lsb', 'dct'); alpha is the DCT
+    # embedding strength
+    method: str = 'lsb'
+    alpha: float = DEFAULT_ALPHA
+    # LSB only: a layout.Layout for multi-bit/multi-channel embedding, and
+    # whether the 'watermark' is an arbitrary byte payload file
+    layout: object = None
+    payload: bool = False
+    # encode.EncodeOptions for encoded outputs (PNG level, TIFF compression,
+    # WebP method); None uses the defaults
+    encoder: object = None
+    # Plain LSB only: one of placement.PLACEMENTS. None means 'stretch', or
+    # 'nearest' in streaming mode, which cannot stretch.
+    placement: str = None
+
+
+@dataclass
+class BatchResult:
+    input_path: str
+    output_path: str
+    seconds: float
+    pixels: int
+    error: str = None
+    score: float = None
+    # Seconds per stage ('load', 'convert', 'resize', 'embed', ...)
+    stages: dict = None
+
+    @property
+    def ok(self):
+        return self.error is None
+
+
+def collect_inputs(source):
+    # source may be a directory, a glob pattern or a manifest file
+    if os.path.isdir(source):
+        paths = [os.path.join(source, name) for name in os.listdir(source)
+                 if name.lower().endswith(IMAGE_EXTENSIONS)]
+        return [(path, None) for path in sorted(paths)]
+    if os.path.isfile(source) and source.lower().endswith(MANIFEST_EXTENSIONS):
+        return read_manifest(source)
+    if os.path.isfile(source):
+        return [(source, None)]
+    return [(path, None) for path in sorted(glob.glob(source, recursive=True))]
+
+
+def read_manifest(manifest_path):
+    # One input per line, optionally followed by an output path
+    # (comma or tab separated). Blank lines and '#' comments are skipped.
+    base = os.path.dirname(os.path.abspath(manifest_path))
+    entries = []
+    with open(manifest_path, newline='') as f:
+        for row in csv.reader(f, delimiter='\t' if _is_tab_separated(manifest_path) else ','):
+            if not row or not row[0].strip() or row[0].lstrip().startswith('#'):
+                continue
+            input_path = os.path.join(base, row[0].strip())
+            output_path = os.path.join(base, row[1].strip()) if len(row) > 1 and row[1].strip() else None
+            entries.append((input_path, output_path))
+    return entries
+
+
+def _is_tab_separated(manifest_path):
+    with open(manifest_path) as f:
+        return '\t' in f.readline()
+
+
+def plan_jobs(entries, output_dir, suffix='.png', in_place=False):
+    # Inputs without an explicit output go to output_dir/<name><suffix>;
+    # suffix=None keeps each input's own extension and in_place=True makes
+    # every output the input itself
+    jobs = []
+    for input_path, output_path in entries:
+        if in_place:
+            output_path = input_path
+        elif output_path is None:
+            if output_dir is None:
+                raise ValueError(f"No output path for {input_path}; pass an output directory")
+            stem, ext = os.path.splitext(os.path.basename(input_path))
+            output_path = os.path.join(output_dir, stem + (ext if suffix is None else suffix))
+        jobs.append(BatchJob(input_path, output_path))
+    _check_distinct_outputs(jobs)
+    return jobs
+
+
+def _check_distinct_outputs(jobs):
+    # Inputs sharing a stem (photo.jpg and photo.png) would otherwise
+    # overwrite each other's output
+    seen = {}
+    for job in jobs:
+        key = os.path.normcase(os.path.abspath(job.output_path))
+        if key in seen:
+            raise ValueError(f"{seen[key]} and {job.input_path} would both be written to "
+                             f"{job.output_path}; rename one or give explicit outputs in a manifest")
+        seen[key] = job.input_path
+
+
+def attach_originals(jobs, originals_dir):
+    # Pair each job with the file in originals_dir that has the same name
+    # stem as its input, whatever the extension
+    by_stem = {}
+    for name in sorted(os.listdir(originals_dir)):
+        if name.lower().endswith(IMAGE_EXTENSIONS):
+            by_stem.setdefault(os.path.splitext(name)[0], os.path.join(originals_dir, name))
+    for job in jobs:
+        stem = os.path.splitext(os.path.basename(job.input_path))[0]
+        job.original_path = by_stem.get(stem)
+    return jobs
+
+
+def run_job(operation, job, watermark_path=None, options=None):
+    # Errors are captured per item so one bad file never aborts a batch.
+    # Every path reports its stages to a StageTimer, so results carry the
+    # seconds spent loading, converting, resizing, embedding and encoding.
+    options = options or JobOptions()
+    mode = options.mode
+    if mode == 'decode' and is_mapped_path(job.input_path):
+        mode = 'mmap'
+    timer = StageTimer()
+    start = time.perf_counter()
+    try:
+        score = None
+        if (operation == 'embed' and job.output_path and not is_mapped_path(job.output_path)
+                and get_method(options.method).lossless_only):
+            check_lossless(job.output_path)
+        output_dir = os.path.dirname(job.output_path or '')
+        if output_dir:
+            os.makedirs(output_dir, exist_ok=True)
+        if operation == 'check':
+            score, (width, height) = check_watermark(job.input_path, watermark_path,
+                                                     cache=watermark_cache,
+                                                     raw_shape=options.raw_shape,
+                                                     progress=timer,
+                                                     placement=options.placement or
+                                                     DEFAULT_PLACEMENT)
+        elif operation == 'extract' and options.packed:
+            timer('extract')
+            packed, width = extract_bitplane(job.input_path, options.raw_shape)
+            height = packed.shape[0]
+            timer('encode')
+            np.savez(job.output_path, bits=packed, width=width)
+        elif operation not in ('embed', 'extract'):
+            raise ValueError(f"Unknown operation: {operation}")
+        elif job.input_path.lower().endswith(RAW_EXTENSIONS) and (
+                options.method != 'lsb' or options.layout is not None or options.payload):
+            # These decode the host, which needs a header
+            raise ValueError("Headerless raw input only works with plain LSB embedding and "
+                             "extraction; convert it to .npy for other methods and layouts")
+        elif options.method == 'lsb' and (options.layout is not None or options.payload):
+            width, height = _run_layered(operation, job, watermark_path, options, timer)
+        elif options.method == 'lsb' and mode != 'decode':
+            width, height = _run_lsb_mode(operation, job, watermark_path, options, mode, timer)
+        else:
+            width, height = _run_method(operation, job, watermark_path, options, timer)
+    except Exception as e:
+        seconds = time.perf_counter() - start
+        return BatchResult(job.input_path, job.output_path, seconds, 0,
+                           f"{type(e).__name__}: {e}", stages=timer.finish())
+    seconds = time.perf_counter() - start
+    return BatchResult(job.input_path, job.output_path, seconds, width * height, score=score,
+                       stages=timer.finish())
+
+
+def is_mapped_path(path):
+    # .npy and headerless raw files, read and written through numpy
+    return path.lower().endswith(('.npy',) + RAW_EXTENSIONS)
+
+
+def _same_format(job):
+    return (os.path.splitext(job.input_path)[1].lower() ==
+            os.path.splitext(job.output_path or job.input_path)[1].lower())
+
+
+def _run_method(operation, job, watermark_path, options, timer):
+    # Whole-image decode through the method registry
+    method = get_method(options.method)
+    if options.mode != 'decode':
+        raise ValueError(f"{method.name.upper()} watermarking only supports the default "
+                         "decode mode")
+    if options.placement is not None and 'placement' not in method.params:
+        raise ValueError(f"{method.name.upper()} watermarking does not take a placement")
+    if operation == 'embed':
+        size, _ = method.embed(job.input_path, watermark_path, job.output_path,
+                               progress=timer, encoder=options.encoder,
+                               cache=watermark_cache, alpha=options.alpha,
+                               placement=options.placement)
+    else:
+        size, _ = method.extract(job.input_path, job.output_path, job.original_path,
+                                 progress=timer, encoder=options.encoder)
+    return size
+
+
+def _run_lsb_mode(operation, job, watermark_path, options, mode, timer):
+    # LSB-only fast paths that never hold a decoded copy of the host
+    if operation == 'embed' and mode == 'streaming':
+        return embed_lsb_streaming(job.input_path, watermark_path, job.output_path,
+                                   options.strip_rows, progress=timer, encoder=options.encoder,
+                                   placement=options.placement or 'nearest')
+    if operation == 'embed' and is_mapped_path(job.input_path) and not _same_format(job):
+        # An .npy/raw host going to .png and the like; embed_lsb_mapped
+        # only copies the input byte for byte
+        return embed_lsb_converted(job.input_path, watermark_path, job.output_path,
+                                   cache=watermark_cache, raw_shape=options.raw_shape,
+                                   progress=timer, encoder=options.encoder,
+                                   placement=options.placement or DEFAULT_PLACEMENT)
+    if operation == 'embed':
+        return embed_lsb_mapped(job.input_path, watermark_path, job.output_path,
+                                cache=watermark_cache, raw_shape=options.raw_shape,
+                                progress=timer,
+                                placement=options.placement or DEFAULT_PLACEMENT)
+    if mode == 'streaming':
+        return extract_lsb_streaming(job.input_path, job.output_path, options.strip_rows,
+                                     progress=timer, encoder=options.encoder)
+    return extract_lsb_mapped(job.input_path, job.output_path, raw_shape=options.raw_shape,
+                              progress=timer, encoder=options.encoder)
+
+
+def _run_layered(operation, job, watermark_path, options, timer):
+    if options.mode != 'decode':
+        raise ValueError("Layouts and payloads only support the default decode mode")
+    if options.placement not in (None, 'stretch'):
+        raise ValueError("Layouts and payloads always stretch the watermark")
+    layout = options.layout or Layout()
+    if operation == 'embed' and options.payload:
+        return embed_payload(job.input_path, watermark_path, job.output_path, layout,
+                             progress=timer, encoder=options.encoder)
+    if operation == 'embed':
+        return embed_layered(job.input_path, watermark_path, job.output_path, layout,
+                             progress=timer, encoder=options.encoder)
+    if options.payload:
+        return extract_payload(job.input_path, job.output_path, layout, progress=timer)
+    return extract_layered(job.input_path, job.output_path, layout, progress=timer,
+                           encoder=options.encoder)
+
+
+def _init_worker(cache_bytes):
+    watermark_cache.max_bytes = cache_bytes
+    watermark_cache.clear()
+
+
+def run_batch(operation, jobs, watermark_path=None, workers=1, max_in_flight=None,
+              ordered=True, cache_bytes=DEFAULT_CACHE_BYTES, options=None):
+    # workers > 1 fans jobs out over a process pool. At most max_in_flight
+    # jobs are submitted at once (default: twice the worker count), so the
+    # memory held by pending images stays flat however long the job list is.
+    # With ordered=False results are yielded as soon as they complete.
+    # options is a JobOptions choosing how each image is read and written.
+    if operation not in ('embed', 'extract', 'check'):
+        raise ValueError(f"Unknown operation: {operation}")
+    if operation in ('embed', 'check') and not watermark_path:
+        raise ValueError(f"{operation.capitalize()} needs a watermark image")
+
+    if workers <= 1:
+        watermark_cache.max_bytes = cache_bytes
+        for job in jobs:
+            yield run_job(operation, job, watermark_path, options)
+        return
+
+    if max_in_flight is None:
+        max_in_flight = workers * 2
+    max_in_flight = max(max_in_flight, workers)
+
+    # Imported here: it loads multiprocessing, which single-process runs
+    # (the common short-lived worker case) never need
+    from concurrent.futures import ProcessPoolExecutor
+    jobs = iter(jobs)
+    with ProcessPoolExecutor(max_workers=workers, initializer=_init_worker,
+                             initargs=(cache_bytes,)) as pool:
+        pending = deque()
+
+        def submit_next():
+            job = next(jobs, None)
+            if job is None:
+                return False
+            future = pool.submit(run_job, operation, job, watermark_path, options)
+            pending.append((job, future))
+            return True
+
+        while len(pending) < max_in_flight and submit_next():
+            pass
+
+        while pending:
+            if ordered:
+                done = [pending.popleft()]
+            else:
+                finished, _ = wait([future for _, future in pending], return_when=FIRST_COMPLETED)
+                done = [entry for entry in pending if entry[1] in finished]
+                for entry in done:
+                    pending.remove(entry)
+            for job, future in done:
+                yield _future_result(job, future)
+                submit_next()
+
+
+def _future_result(job, future):
+    # run_job already captures its own errors; this covers the worker dying
+    try:
+        return future.result()
+    except Exception as e:
+        return BatchResult(job.input_path, job.output_path, 0.0, 0,
+                           f"{type(e).__name__}: {e}")
+
+
+def summarize(results, wall_seconds):
+    count = len(results)
+    busy = sum(r.seconds for r in results)
+    megapixels = sum(r.pixels for r in results) / 1e6
+    stage_seconds = {}
+    for r in results:
+        for stage, seconds in (r.stages or {}).items():
+            stage_seconds[stage] = stage_seconds.get(stage, 0.0) + seconds
+    return {
+        'images': count,
+        'failed': sum(1 for r in results if not r.ok),
+        'wall_seconds': wall_seconds,
+        'busy_seconds': busy,
+        'mean_seconds': busy / count if count else 0.0,
+        'images_per_second': count / wall_seconds if wall_seconds else 0.0,
+        'megapixels_per_second': megapixels / wall_seconds if wall_seconds else 0.0,
+        # Total seconds per stage across all images
+        'stage_seconds': stage_seconds,
+    }
@@ -0,0 +1,107 @@
+"""Extract-only fast path: read just the red channel's LSB plane.
+
+Verification jobs do not need an output image. These helpers load only
+channel 0 (straight from the file when it is memory-mappable), pack the
+LSBs with np.packbits, and compare them with a reference watermark.
+"""
+import io
+import os
+
+import numpy as np
+from PIL import Image
+
+from .core import DEFAULT_THRESHOLD, _report, make_placement
+from .defaults import DEFAULT_PLACEMENT
+from .mmap_io import RAW_EXTENSIONS, open_mapped
+from .rawio import raw_layout
+
+# Rows handled per step, so no full-size temporary is ever allocated
+CHUNK_ROWS = 1024
+
+if hasattr(np, 'bitwise_count'):
+    def popcount(packed):
+        return int(np.bitwise_count(packed).sum(dtype=np.int64))
+else:
+    _POPCOUNT = np.array([bin(value).count('1') for value in range(256)], dtype=np.uint8)
+
+    def popcount(packed):
+        return int(_POPCOUNT[packed].sum(dtype=np.int64))
+
+
+def red_planes(path, raw_shape=None):
+    # Yields (top, red) pairs covering the image; red is (rows, width) uint8
+    ext = os.path.splitext(path)[1].lower()
+    if ext in ('.npy',) + RAW_EXTENSIONS or raw_layout(path) is not None:
+        mapped = open_mapped(path, 'r', raw_shape)
+        try:
+            yield from mapped.red_planes()
+        finally:
+            mapped.close()
+        return
+    with Image.open(path) as img:
+        yield 0, _red_channel(img)
+
+
+def _red_channel(img):
+    if img.mode == 'L':
+        return np.asarray(img)
+    if img.mode in ('RGB', 'RGBA', 'RGBX'):
+        return np.asarray(img.getchannel('R'))
+    return np.asarray(img.convert('RGB').getchannel('R'))
+
+
+def extract_bitplane(path, raw_shape=None):
+    # Returns (packed, width): the LSB plane packed per row with np.packbits,
+    # shape (height, ceil(width / 8)), plus the unpacked width
+    chunks = []
+    width = 0
+    for top, red in red_planes(path, raw_shape):
+        width = red.shape[1]
+        for start in range(0, red.shape[0], CHUNK_ROWS):
+            chunks.append(np.packbits(red[start:start + CHUNK_ROWS] & 1, axis=1))
+    return (np.concatenate(chunks) if len(chunks) > 1 else chunks[0]), width
+
+
+def reference_bitplane(watermark_path, size, threshold=DEFAULT_THRESHOLD, cache=None,
+                       placement=DEFAULT_PLACEMENT):
+    # The bits embed_lsb would have written for a host of this (width, height)
+    width, height = size
+    placed = make_placement(watermark_path, width, height, placement, cache, threshold)
+    chunks = [np.packbits(placed.plane(top, min(CHUNK_ROWS, height - top)), axis=1)
+              for top in range(0, height, CHUNK_ROWS)]
+    return np.concatenate(chunks) if len(chunks) > 1 else chunks[0]
+
+
+def match_score(packed, reference, width):
+    # Fraction of pixels whose LSB matches the reference (1.0 = identical).
+    # Both planes are packed per row, so their zero padding never differs.
+    if packed.shape != reference.shape:
+        raise ValueError(f"Bit plane shapes differ: {packed.shape} vs {reference.shape}")
+    mismatched = 0
+    for start in range(0, packed.shape[0], CHUNK_ROWS):
+        rows = slice(start, start + CHUNK_ROWS)
+        mismatched += popcount(np.bitwise_xor(packed[rows], reference[rows]))
+    return 1.0 - mismatched / (packed.shape[0] * width)
+
+
+def check_watermark(path, watermark_path, cache=None, raw_shape=None, progress=None,
+                    placement=DEFAULT_PLACEMENT):
+    # Returns (match score, (width, height)) without writing any image
+    _report(progress, 'extract')
+    packed, width = extract_bitplane(path, raw_shape)
+    size = (width, packed.shape[0])
+    _report(progress, 'resize')
+    reference = reference_bitplane(watermark_path, size, cache=cache, placement=placement)
+    _report(progress, 'compare')
+    return match_score(packed, reference, width), size
+
+
+def check_watermark_bytes(data, watermark_path, cache=None, placement=DEFAULT_PLACEMENT):
+    # check_watermark for an encoded image held in memory
+    with Image.open(io.BytesIO(data)) as img:
+        red = _red_channel(img)
+    height, width = red.shape
+    packed = np.packbits(red & 1, axis=1)
+    reference = reference_bitplane(watermark_path, (width, height), cache=cache,
+                                   placement=placement)
+    return match_score(packed, reference, width), (width, height)
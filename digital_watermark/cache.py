@@ -0,0 +1,70 @@
+"""LRU cache of prepared (resized and thresholded) watermark bit planes."""
+import os
+import threading
+from collections import OrderedDict
+
+import numpy as np
+
+from .core import DEFAULT_THRESHOLD, prepare_watermark
+
+DEFAULT_CACHE_BYTES = 64 * 1024 * 1024
+
+
+class WatermarkCache:
+    # Planes are stored packed with np.packbits (one bit per pixel), so a
+    # 50 MP host costs about 6 MB. Entries are keyed by the watermark file's
+    # identity (path, mtime, size) plus the target size and threshold, and
+    # the least recently used ones are evicted once max_bytes is exceeded.
+
+    def __init__(self, max_bytes=DEFAULT_CACHE_BYTES):
+        self.max_bytes = max_bytes
+        self.hits = 0
+        self.misses = 0
+        self._entries = OrderedDict()
+        self._bytes = 0
+        self._lock = threading.Lock()
+
+    def __len__(self):
+        return len(self._entries)
+
+    @property
+    def nbytes(self):
+        return self._bytes
+
+    def get(self, watermark_path, size, threshold=DEFAULT_THRESHOLD):
+        # Same contract as prepare_watermark: an (height, width) 0/1 plane,
+        # at the watermark's own size when size is None
+        key = (_file_identity(watermark_path), size and tuple(size), threshold)
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is not None:
+                self._entries.move_to_end(key)
+                self.hits += 1
+        if entry is None:
+            plane = prepare_watermark(watermark_path, size, threshold)
+            self._store(key, (np.packbits(plane), plane.shape))
+            return plane
+        packed, (height, width) = entry
+        return np.unpackbits(packed, count=width * height).reshape(height, width)
+
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
+            self._bytes = 0
+
+    def _store(self, key, entry):
+        packed = entry[0]
+        with self._lock:
+            self.misses += 1
+            if packed.nbytes > self.max_bytes or key in self._entries:
+                return
+            self._entries[key] = entry
+            self._bytes += packed.nbytes
+            while self._bytes > self.max_bytes:
+                _, (evicted, _) = self._entries.popitem(last=False)
+                self._bytes -= evicted.nbytes
+
+
+def _file_identity(path):
+    stat = os.stat(path)
+    return (os.path.realpath(path), stat.st_mtime_ns, stat.st_size)
@@ -0,0 +1,478 @@
+"""Command line entry point: python -m digital_watermark embed|extract ..."""
+import argparse
+import json
+import math
+import os
+import sys
+import time
+
+from .defaults import (DEFAULT_ALPHA, DEFAULT_PLACEMENT, DEFAULT_QUEUE_SIZE, PLACEMENTS,
+                       TIFF_COMPRESSIONS, parse_shape)
+from .methods import available_methods, format_stages, get_method
+
+
+def build_parser():
+    parser = argparse.ArgumentParser(
+        prog='digital_watermark',
+        description='Embed, extract or check LSB watermarks over a directory, glob or manifest.')
+    subparsers = parser.add_subparsers(dest='command', required=True)
+
+    embed = subparsers.add_parser('embed', help='Embed a watermark into host images')
+    embed.add_argument('sources', nargs='+', help='Directories, glob patterns or manifests of host images')
+    source = embed.add_mutually_exclusive_group(required=True)
+    source.add_argument('-w', '--watermark', help='Watermark image')
+    source.add_argument('--payload', help='Embed the bytes of this file instead of an image')
+    embed.add_argument('-o', '--output-dir', help='Where to write watermarked images')
+    embed.add_argument('--in-place', action='store_true',
+                       help='With --mmap, watermark the input files themselves')
+
+    extract = subparsers.add_parser('extract', help='Extract watermarks from images')
+    extract.add_argument('sources', nargs='+',
+                         help='Directories, glob patterns or manifests of watermarked images')
+    extract.add_argument('-o', '--output-dir', help='Where to write extracted watermarks')
+    extract.add_argument('--originals',
+                         help='Directory of unmarked hosts, matched by file name (needed for DCT)')
+    extract.add_argument('--payload', action='store_true',
+                         help='Extract an embedded byte payload (saved as .bin)')
+    extract.add_argument('--packed', action='store_true',
+                         help="Save the packed LSB plane as .npz ('bits', 'width') instead of "
+                              "an image")
+
+    check = subparsers.add_parser(
+        'check', help='Score images against a watermark without writing any output')
+    check.add_argument('sources', nargs='+',
+                       help='Directories, glob patterns or manifests of images to check')
+    check.add_argument('-w', '--watermark', required=True, help='Reference watermark image')
+    check.add_argument('--min-score', type=float, default=0.95,
+                       help='Fraction of matching bits that counts as a match (default: 0.95)')
+
+    video = subparsers.add_parser(
+        'video', help='Watermark every frame of a video or image sequence')
+    video.add_argument('source', help='Video file, directory of frames or glob pattern')
+    video.add_argument('output', help='Lossless video (.mkv/.avi, FFV1) or output directory')
+    video.add_argument('-w', '--watermark', required=True, help='Watermark image')
+    video.add_argument('--queue', type=int, default=DEFAULT_QUEUE_SIZE,
+                       help=f'Frames buffered between stages (default: {DEFAULT_QUEUE_SIZE})')
+    video.add_argument('--json', action='store_true', help='Print the summary as JSON')
+
+    index = subparsers.add_parser(
+        'index', help='Add LSB signatures of images to an on-disk index (skips unchanged files)')
+    index.add_argument('sources', nargs='+', help='Directories, glob patterns or manifests')
+    index.add_argument('--db', required=True, help='Index database file (SQLite)')
+    index.add_argument('-j', '--workers', type=int, default=1, help='Worker processes')
+    index.add_argument('--json', action='store_true', help='Print the scan summary as JSON')
+
+    find = subparsers.add_parser('find', help='List indexed images that carry a watermark')
+    find.add_argument('-w', '--watermark', required=True, help='Watermark image')
+    find.add_argument('--db', required=True, help='Index database file (SQLite)')
+    find.add_argument('--min-similarity', type=float, default=0.9,
+                      help='Fraction of matching signature cells (default: 0.9)')
+    find.add_argument('--exact', action='store_true',
+                      help='Only list files whose whole LSB plane is exactly the embedded '
+                           'watermark (no edits since embedding); ignores --min-similarity')
+    find.add_argument('--json', action='store_true', help='Print one JSON object per match')
+
+    serve = subparsers.add_parser(
+        'serve', help='Serve embed/extract/verify over HTTP on TCP or a Unix socket')
+    serve.add_argument('-w', '--watermark', action='append', required=True,
+                       metavar='[NAME=]PATH',
+                       help='Watermark available to requests as ?watermark=NAME; repeatable. '
+                            'The first one is the default')
+    # Unset tuning flags fall back to the service module's defaults, so
+    # building the parser does not import asyncio and the HTTP stack
+    serve.add_argument('--host', default='127.0.0.1', help='Address to listen on')
+    serve.add_argument('--port', type=int, help='TCP port (default: 8080)')
+    serve.add_argument('--unix', metavar='PATH', help='Listen on this Unix socket instead')
+    serve.add_argument('-j', '--workers', type=int, default=2,
+                       help='Worker processes (default: 2)')
+    serve.add_argument('--max-pending', type=int,
+                       help='Requests queued or running before new ones get 503 (default: 64)')
+    serve.add_argument('--max-batch', type=int,
+                       help='Most requests sent to a worker at once (default: 8)')
+    serve.add_argument('--batch-ms', type=float,
+                       help='How long to wait for a batch to fill (default: 2)')
+    serve.add_argument('--max-body-mb', type=float, help='Largest accepted upload (default: 64)')
+
+    evaluate = subparsers.add_parser(
+        'evaluate', help='Measure how well each method survives JPEG, resize, crop and noise')
+    evaluate.add_argument('sources', nargs='+',
+                          help='Directories, glob patterns or manifests of host images')
+    evaluate.add_argument('-w', '--watermark', required=True, help='Watermark image')
+    evaluate.add_argument('-m', '--methods', nargs='+',
+                          choices=[m.name for m in available_methods() if m.in_memory],
+                          help='Methods to compare (default: all)')
+    evaluate.add_argument('--attacks', nargs='+', metavar='KIND[:VALUE]',
+                          help='Attacks to run: none, jpeg:Q, resize:S, crop:F, noise:SIGMA '
+                               '(default: a matrix of all four kinds)')
+    evaluate.add_argument('--alpha', type=float, default=DEFAULT_ALPHA,
+                          help=f'DCT embedding strength (default: {DEFAULT_ALPHA})')
+    evaluate.add_argument('--max-ber', type=float, default=0.1,
+                          help='Bit error rate up to which an attack counts as survived '
+                               '(default: 0.1)')
+    evaluate.add_argument('--seed', type=int, default=0, help='Seed for the noise attacks')
+    evaluate.add_argument('-j', '--workers', type=int, default=1,
+                          help='Worker processes (default: 1, run in-process)')
+    evaluate.add_argument('--json', action='store_true',
+                          help='Print one JSON object per host and method plus a summary line')
+
+    for sub in (embed, check, video, find, evaluate):
+        sub.add_argument('--placement', choices=PLACEMENTS,
+                         help='How the watermark covers the host: stretch (smooth resize, the '
+                              'default), nearest, tile, center or a corner at its own size; '
+                              'check and find must use the placement the images were '
+                              'embedded with')
+
+    for sub in (embed, extract, video, serve):
+        encode = sub.add_argument_group('output encoding')
+        encode.add_argument('--compress-level', type=int, choices=range(10), default=6,
+                            metavar='0-9',
+                            help='PNG zlib level: 0 is fastest and largest (default: 6)')
+        encode.add_argument('--optimize', action='store_true',
+                            help='Search for the smallest PNG encoding (slow)')
+        encode.add_argument('--tiff-compression', choices=TIFF_COMPRESSIONS, default='raw',
+                            help='TIFF compression (default: raw, uncompressed)')
+        encode.add_argument('--webp-method', type=int, choices=range(7), default=4,
+                            metavar='0-6',
+                            help='Lossless WebP effort: 0 is fastest (default: 4)')
+    video.add_argument('--frame-ext', default='.png',
+                       help='Frame format when writing an image sequence (default: .png)')
+
+    for sub in (embed, check, serve):
+        sub.add_argument('--cache-mb', type=float, default=64,
+                         help='Memory for cached watermark planes per process (default: 64)')
+
+    for sub in (embed, extract, check):
+        sub.add_argument('--json', action='store_true',
+                         help='Print one JSON object per image plus a summary line')
+        sub.add_argument('-q', '--quiet', action='store_true', help='Only print the summary')
+        sub.add_argument('-j', '--workers', type=int, default=1,
+                         help='Worker processes (default: 1, run in-process)')
+        sub.add_argument('--max-in-flight', type=int,
+                         help='Most jobs queued on the pool at once (default: 2 x workers)')
+        sub.add_argument('--unordered', action='store_true',
+                         help='Report results as they finish instead of in input order')
+        sub.add_argument('--raw-shape', type=parse_shape,
+                         help='HEIGHTxWIDTH[xC] of headerless .raw/.rgb inputs')
+
+    for sub in (embed, extract):
+        sub.add_argument('-m', '--method', choices=[m.name for m in available_methods()],
+                         default='lsb', help='Watermarking method (default: lsb)')
+        sub.add_argument('--alpha', type=float, default=DEFAULT_ALPHA,
+                         help=f'DCT embedding strength (default: {DEFAULT_ALPHA})')
+        sub.add_argument('--bits', type=int, choices=(1, 2, 3, 4),
+                         help='LSB bits per channel; stores a grayscale watermark with up to '
+                              '8 bits per pixel instead of thresholding it')
+        sub.add_argument('--channels',
+                         help='Channels to embed into with --bits/--payload, e.g. r, rg, rgb '
+                              '(default: r)')
+        mode = sub.add_mutually_exclusive_group()
+        mode.add_argument('--streaming', action='store_true',
+                          help='Process each image in row strips to bound memory '
+                               '(output must be .png, .ppm or .npy)')
+        mode.add_argument('--mmap', action='store_true',
+                          help='Memory-map uncompressed inputs (.npy, raw, BMP, PPM, TIFF) '
+                               'and change LSBs in the file without decoding')
+        sub.add_argument('--strip-rows', type=int,
+                         help='Rows per strip in streaming mode (default: about 16 MB of pixels)')
+        sub.add_argument('--suffix',
+                         help='Output file extension: .png, .tif, .bmp, .ppm or .webp '
+                              '(lossless); default .png, embed --mmap keeps the input format')
+    return parser
+
+
+def main(argv=None):
+    # The parser needs nothing heavier than defaults and methods; numpy and
+    # PIL are only loaded once a command actually runs
+    args = build_parser().parse_args(argv)
+    if args.command == 'video':
+        return run_video(args)
+    if args.command == 'index':
+        return run_index(args)
+    if args.command == 'find':
+        return run_find(args)
+    if args.command == 'serve':
+        return run_serve(args)
+    if args.command == 'evaluate':
+        return run_evaluate(args)
+
+    from .batch import BatchJob, JobOptions, attach_originals, collect_inputs, run_batch, summarize
+    entries = [entry for source in args.sources for entry in collect_inputs(source)]
+    if not entries:
+        print(f"No images found for {' '.join(args.sources)}", file=sys.stderr)
+        return 1
+    if args.command == 'check':
+        jobs = [BatchJob(input_path, None) for input_path, _ in entries]
+        options = JobOptions(raw_shape=args.raw_shape, placement=args.placement)
+    else:
+        error = _unsupported_options(args)
+        if error:
+            print(f"Error: {error}", file=sys.stderr)
+            return 2
+        jobs = _plan_output_jobs(args, entries)
+        if jobs is None:
+            return 2
+        options = JobOptions('streaming' if args.streaming else 'mmap' if args.mmap else 'decode',
+                             args.strip_rows, args.raw_shape, getattr(args, 'packed', False),
+                             args.method, args.alpha, _layout(args), bool(args.payload),
+                             _encoder(args), getattr(args, 'placement', None))
+        if args.command == 'extract' and args.originals:
+            attach_originals(jobs, args.originals)
+    results = []
+    start = time.perf_counter()
+    watermark_path = args.payload if args.command == 'embed' and args.payload \
+        else getattr(args, 'watermark', None)
+    batch = run_batch(args.command, jobs, watermark_path,
+                      workers=args.workers, max_in_flight=args.max_in_flight,
+                      ordered=not args.unordered,
+                      cache_bytes=int(getattr(args, 'cache_mb', 0) * 1024 * 1024),
+                      options=options)
+    for result in batch:
+        results.append(result)
+        if args.quiet:
+            continue
+        if args.json:
+            record = {'input': result.input_path, 'output': result.output_path,
+                      'seconds': round(result.seconds, 6), 'pixels': result.pixels,
+                      'error': result.error,
+                      'stages': {stage: round(seconds, 6)
+                                 for stage, seconds in (result.stages or {}).items()}}
+            if result.score is not None:
+                record['score'] = result.score
+                record['match'] = result.score >= args.min_score
+            print(json.dumps(record))
+        elif result.ok and result.score is not None:
+            verdict = 'match' if result.score >= args.min_score else 'no match'
+            print(f"{result.input_path}: {verdict} (score {result.score:.4f}, "
+                  f"{result.seconds * 1000:.1f} ms)")
+        elif result.ok:
+            print(f"{result.input_path} -> {result.output_path} ({result.seconds * 1000:.1f} ms)")
+        else:
+            print(f"{result.input_path} FAILED: {result.error}", file=sys.stderr)
+    summary = summarize(results, time.perf_counter() - start)
+    if args.command == 'check':
+        summary['matched'] = sum(1 for r in results if r.ok and r.score >= args.min_score)
+
+    if args.json:
+        print(json.dumps(_finite({'summary': summary})))
+    else:
+        print(f"{summary['images']} images in {summary['wall_seconds']:.2f} s "
+              f"({summary['images_per_second']:.1f} img/s, "
+              f"{summary['megapixels_per_second']:.1f} MP/s, "
+              f"mean {summary['mean_seconds'] * 1000:.1f} ms/img, "
+              f"{summary['failed']} failed)")
+        if summary['stage_seconds'] and summary['images']:
+            mean = {stage: seconds / summary['images']
+                    for stage, seconds in summary['stage_seconds'].items()}
+            print(f"Mean per image: {format_stages(mean)}")
+        if 'matched' in summary:
+            print(f"{summary['matched']} of {summary['images']} images carry the watermark")
+    return 1 if summary['failed'] else 0
+
+
+def run_video(args):
+    from .video import run_video_pipeline
+    try:
+        summary = run_video_pipeline(args.source, args.output, args.watermark, args.queue,
+                                     frame_ext=args.frame_ext, encoder=_encoder(args),
+                                     placement=args.placement or DEFAULT_PLACEMENT)
+    except (OSError, RuntimeError, ValueError) as e:
+        print(f"Error: {e}", file=sys.stderr)
+        return 1
+    if args.json:
+        print(json.dumps(_finite({'summary': summary})))
+    else:
+        print(f"{summary['frames']} frames in {summary['seconds']:.2f} s "
+              f"({summary['frames_per_second']:.1f} fps)")
+    return 0
+
+
+def run_index(args):
+    from .batch import collect_inputs
+    from .index import SignatureIndex
+    paths = [path for source in args.sources for path, _ in collect_inputs(source)]
+    # Directory sources, including ones deleted since the last scan, are
+    # pruned of indexed files that no longer exist
+    roots = [source for source in args.sources
+             if os.path.isdir(source) or not os.path.exists(source)]
+    with SignatureIndex(args.db) as index:
+        start = time.perf_counter()
+        stats = index.scan(paths, workers=args.workers, roots=roots)
+        stats['seconds'] = time.perf_counter() - start
+        stats['indexed'] = len(index)
+    if args.json:
+        print(json.dumps(stats))
+    else:
+        for path, error in stats['errors'].items():
+            print(f"{path} FAILED: {error}", file=sys.stderr)
+        print(f"{stats['analysed']} analysed, {stats['hashed'] - stats['analysed']} already known, "
+              f"{stats['unchanged']} unchanged, {stats['failed']} failed, "
+              f"{stats['removed']} removed in {stats['seconds']:.2f} s; "
+              f"{stats['indexed']} files indexed")
+    return 1 if stats['failed'] else 0
+
+
+def run_find(args):
+    from .index import SignatureIndex
+    with SignatureIndex(args.db) as index:
+        start = time.perf_counter()
+        placement = args.placement or DEFAULT_PLACEMENT
+        if args.exact:
+            matches = [(path, 1.0) for path in index.query_exact(args.watermark, placement)]
+        else:
+            matches = index.query(args.watermark, args.min_similarity, placement)
+        seconds = time.perf_counter() - start
+    for path, similarity in matches:
+        if args.json:
+            print(json.dumps({'path': path, 'similarity': similarity}))
+        else:
+            print(f"{similarity:.3f}  {path}")
+    if not args.json:
+        print(f"{len(matches)} matching files ({seconds * 1000:.0f} ms)", file=sys.stderr)
+    return 0
+
+
+def run_serve(args):
+    import asyncio
+    from .service import DEFAULT_PORT, WatermarkService, serve
+    watermarks = {}
+    for value in args.watermark:
+        name, sep, path = value.partition('=')
+        if not sep:
+            name, path = os.path.splitext(os.path.basename(value))[0], value
+        watermarks[name] = path
+    tuning = {'max_pending': args.max_pending, 'max_batch': args.max_batch,
+              'batch_delay': args.batch_ms and args.batch_ms / 1000,
+              'max_body_bytes': args.max_body_mb and int(args.max_body_mb * 2 ** 20)}
+    try:
+        service = WatermarkService(watermarks, args.workers,
+                                   cache_bytes=int(args.cache_mb * 2 ** 20),
+                                   encoder=_encoder(args),
+                                   **{name: value for name, value in tuning.items()
+                                      if value is not None})
+    except ValueError as e:
+        print(f"Error: {e}", file=sys.stderr)
+        return 1
+
+    def ready(address):
+        where = address if isinstance(address, str) else f"http://{address[0]}:{address[1]}"
+        print(f"Serving on {where} with {args.workers} workers; "
+              f"watermarks: {', '.join(watermarks)}", file=sys.stderr)
+
+    try:
+        asyncio.run(serve(service, args.host, args.port or DEFAULT_PORT, args.unix, ready))
+    except OSError as e:
+        print(f"Error: {e}", file=sys.stderr)
+        return 1
+    return 0
+
+
+def run_evaluate(args):
+    from .batch import collect_inputs
+    from .evaluate import (DEFAULT_ATTACKS, EvaluationOptions, evaluable_methods,
+                           format_summary, parse_attack, run_evaluation, summarize_evaluation)
+    try:
+        attacks = tuple(parse_attack(spec) for spec in args.attacks or DEFAULT_ATTACKS)
+    except ValueError as e:
+        print(f"Error: {e}", file=sys.stderr)
+        return 2
+    methods = args.methods or evaluable_methods()
+    paths = [path for source in args.sources for path, _ in collect_inputs(source)]
+    if not paths:
+        print(f"No images found for {' '.join(args.sources)}", file=sys.stderr)
+        return 1
+    options = EvaluationOptions(attacks, args.alpha, args.placement or DEFAULT_PLACEMENT,
+                                args.seed)
+    results = []
+    start = time.perf_counter()
+    try:
+        for result in run_evaluation(paths, args.watermark, methods, options, args.workers):
+            results.append(result)
+            if args.json:
+                print(json.dumps(_finite({'input': result.host_path, 'method': result.method,
+                                          'psnr': result.psnr, 'ssim': result.ssim,
+                                          'attacks': result.attacks,
+                                          'error': result.error})))
+            elif not result.ok:
+                print(f"{result.host_path} FAILED ({result.method}): {result.error}",
+                      file=sys.stderr)
+    except ValueError as e:
+        print(f"Error: {e}", file=sys.stderr)
+        return 2
+    summary = summarize_evaluation(results, args.max_ber)
+    summary['seconds'] = time.perf_counter() - start
+    if args.json:
+        print(json.dumps(_finite({'summary': summary})))
+    else:
+        print(format_summary(summary))
+        print(f"{len(paths)} hosts x {len(methods)} methods x {len(attacks)} attacks "
+              f"in {summary['seconds']:.2f} s, {summary['failed']} failed")
+    return 1 if summary['failed'] else 0
+
+
+def _finite(value):
+    # JSON has no Infinity or NaN: an identical image's PSNR (inf) and an
+    # undefined SSIM (NaN) are written as null
+    if isinstance(value, float) and not math.isfinite(value):
+        return None
+    if isinstance(value, dict):
+        return {key: _finite(item) for key, item in value.items()}
+    if isinstance(value, (list, tuple)):
+        return [_finite(item) for item in value]
+    return value
+
+
+def _encoder(args):
+    from .encode import EncodeOptions
+    return EncodeOptions(args.compress_level, args.optimize, args.tiff_compression,
+                         args.webp_method)
+
+
+def _unsupported_options(args):
+    # Layouts and payloads are LSB-only; any other method would ignore the
+    # flags, or take the payload file for a watermark image
+    if args.method == 'lsb':
+        return None
+    given = [flag for flag, value in (('--bits', args.bits), ('--channels', args.channels),
+                                      ('--payload', args.payload)) if value]
+    if given:
+        return f"-m {args.method} does not support {' or '.join(given)}, which are LSB only"
+    return None
+
+
+def _layout(args):
+    from .layout import Layout
+    if args.bits is None and not args.payload:
+        return None
+    try:
+        return Layout.parse(args.bits or 1, args.channels or 'r')
+    except ValueError as e:
+        raise SystemExit(f"Error: {e}")
+
+
+def _plan_output_jobs(args, entries):
+    from .batch import is_mapped_path, plan_jobs
+    from .encode import is_lossless
+    suffix = args.suffix
+    if suffix is None and args.command == 'extract' and args.packed:
+        suffix = '.npz'
+    elif suffix is None and args.command == 'extract' and args.payload:
+        suffix = '.bin'
+    elif suffix is None and not (args.command == 'embed' and args.mmap):
+        suffix = '.png'
+    in_place = args.command == 'embed' and args.in_place
+    if in_place and not args.mmap:
+        print("Error: --in-place needs --mmap", file=sys.stderr)
+        return None
+    try:
+        jobs = plan_jobs(entries, args.output_dir, suffix, in_place)
+    except ValueError as e:
+        print(f"Error: {e}", file=sys.stderr)
+        return None
+    # An explicit lossy --suffix would fail every job, so it is rejected
+    # here; outputs that keep a lossy input's format fail one by one
+    if (args.command == 'embed' and suffix and not is_lossless(suffix)
+            and not is_mapped_path(suffix) and get_method(args.method).lossless_only):
+        print(f"Error: LSB watermarks need a lossless output format, not {suffix}; "
+              f"use .png, .tif, .bmp, .ppm or .webp", file=sys.stderr)
+        return None
+    return jobs
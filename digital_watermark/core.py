@@ -0,0 +1,145 @@
+"""LSB embed/extract on image files, with no Qt dependency."""
+import io
+
+from PIL import Image
+import numpy as np
+
+from .defaults import DEFAULT_PLACEMENT
+from .encode import encode_image, save_image
+from .placement import Placement
+
+# Grayscale values above this count as a 1 bit in the watermark
+DEFAULT_THRESHOLD = 127
+
+
+def load_host(host_path, progress=None):
+    # host_path may also be a binary file object. The decode counts towards
+    # the caller's 'load' stage; the conversion to an RGB array is 'convert'.
+    # An .npy path holds the (height, width, 3 or 4) uint8 pixels directly.
+    if isinstance(host_path, str) and host_path.lower().endswith('.npy'):
+        pixels = np.load(host_path, mmap_mode='r')
+        if pixels.ndim != 3 or pixels.shape[2] < 3 or pixels.dtype != np.uint8:
+            raise ValueError(f"{host_path}: expected an (height, width, 3) uint8 array")
+        _report(progress, 'convert')
+        return np.array(pixels[..., :3])
+    img = Image.open(host_path)
+    img.load()
+    _report(progress, 'convert')
+    return np.array(img.convert('RGB'))
+
+
+def prepare_watermark(watermark_path, size, threshold=DEFAULT_THRESHOLD):
+    # size is (width, height) like PIL; result is an (height, width) 0/1 plane.
+    # size=None thresholds the watermark at its own resolution.
+    watermark_img = Image.open(watermark_path).convert('L')  # Grayscale
+    if size is not None:
+        watermark_img = watermark_img.resize(size)
+    watermark_pixels = np.array(watermark_img)
+    return (watermark_pixels > threshold).astype(np.uint8)
+
+
+def embed_lsb_array(pixels, watermark_binary, out=None):
+    # Writes watermark_binary (0/1, broadcastable to height x width) into the
+    # red-channel LSBs of an (height, width, channels) uint8 array. With
+    # out=None pixels is modified in place; otherwise pixels is copied into
+    # the caller's preallocated out first. No temporaries are allocated.
+    _check_pixels(pixels)
+    if out is None:
+        out = pixels
+    elif out is not pixels:
+        if out.shape != pixels.shape or out.dtype != np.uint8:
+            raise ValueError("out must be a uint8 array with the same shape as pixels")
+        np.copyto(out, pixels)
+    red = out[..., 0]
+    np.bitwise_and(red, 0xFE, out=red)
+    np.bitwise_or(red, watermark_binary, out=red)
+    return out
+
+
+def extract_lsb_array(pixels, out=None):
+    # Returns the red-channel LSB plane scaled to 0/255 as (height, width)
+    # uint8, written into out when one is supplied
+    _check_pixels(pixels)
+    if out is None:
+        out = np.empty(pixels.shape[:2], dtype=np.uint8)
+    np.bitwise_and(pixels[..., 0], 1, out=out)
+    np.multiply(out, np.uint8(255), out=out)
+    return out
+
+
+def _check_pixels(pixels):
+    if pixels.dtype != np.uint8 or pixels.ndim != 3:
+        raise ValueError("Expected an (height, width, channels) uint8 array")
+
+
+def _report(progress, stage):
+    # progress is an optional callable told which stage is starting; it may
+    # raise to abort the operation (the GUI uses this for cancellation)
+    if progress is not None:
+        progress(stage)
+
+
+def make_placement(watermark_path, width, height, placement=DEFAULT_PLACEMENT, cache=None,
+                   threshold=DEFAULT_THRESHOLD):
+    # Only 'stretch' prepares a host-sized plane; every other placement
+    # keeps the watermark at its own size (see placement.py)
+    size = (width, height) if placement == 'stretch' else None
+    if cache is not None:
+        bits = cache.get(watermark_path, size, threshold)
+    else:
+        bits = prepare_watermark(watermark_path, size, threshold)
+    return Placement(bits, placement, width, height)
+
+
+def embed_lsb_pixels(host_pixels, watermark_path, cache=None, progress=None,
+                     placement=DEFAULT_PLACEMENT):
+    # Embeds into a decoded (height, width, 3) host in place and returns it.
+    # cache: optional WatermarkCache so repeated embeds of the same
+    # watermark skip its decode, resize and threshold.
+    _check_pixels(host_pixels)
+    height, width = host_pixels.shape[:2]
+    _report(progress, 'resize')
+    placed = make_placement(watermark_path, width, height, placement, cache)
+    _report(progress, 'embed')
+    placed.embed_rows(host_pixels[..., 0])
+    return host_pixels
+
+
+def embed_lsb(host_path, watermark_path, output_path, cache=None, progress=None, encoder=None,
+              placement=DEFAULT_PLACEMENT):
+    # encoder: optional EncodeOptions; lossy output paths are rejected.
+    # placement: one of placement.PLACEMENTS
+    _report(progress, 'load')
+    host_pixels = load_host(host_path, progress)
+    embed_lsb_pixels(host_pixels, watermark_path, cache, progress, placement)
+    _report(progress, 'encode')
+    save_image(host_pixels, output_path, encoder)
+    return host_pixels.shape[1], host_pixels.shape[0]
+
+
+def embed_lsb_bytes(host_data, watermark_path, ext='.png', cache=None, encoder=None,
+                    placement=DEFAULT_PLACEMENT):
+    # Encoded host image in, encoded watermarked image out, as bytes.
+    # Returns (data, (width, height)).
+    host_pixels = load_host(io.BytesIO(host_data))
+    embed_lsb_pixels(host_pixels, watermark_path, cache, placement=placement)
+    return encode_image(host_pixels, ext, encoder), (host_pixels.shape[1], host_pixels.shape[0])
+
+
+def extract_lsb(watermarked_path, output_path, progress=None, encoder=None):
+    _report(progress, 'load')
+    watermarked_pixels = load_host(watermarked_path, progress)
+
+    # Extract LSB from red channel
+    _report(progress, 'extract')
+    extracted_img = Image.fromarray(extract_lsb_array(watermarked_pixels))
+    _report(progress, 'encode')
+    save_image(extracted_img, output_path, encoder, allow_lossy=True)
+    return extracted_img.size
+
+
+def extract_lsb_bytes(watermarked_data, ext='.png', encoder=None):
+    # Returns (encoded watermark plane, (width, height))
+    watermarked_pixels = load_host(io.BytesIO(watermarked_data))
+    extracted = extract_lsb_array(watermarked_pixels)
+    return encode_image(extracted, ext, encoder), (extracted.shape[1], extracted.shape[0])
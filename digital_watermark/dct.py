@@ -0,0 +1,138 @@
+"""Block-DCT watermarking, vectorised over all 8x8 blocks at once.
+
+One watermark bit is hidden per 8x8 block of the luma (Y) channel by
+pushing the two mid-frequency coefficients (3, 4) and (4, 3) above or
+below their mean by alpha times its magnitude. Extraction is non-blind:
+it compares those coefficients against the original host.
+
+Only the two coefficients are ever needed, and the 2-D DCT is linear, so
+all blocks are reshaped to an (N, 64) matrix and projected onto the two
+basis images with a single matrix multiply. The change is mapped back to
+pixels the same way, which is exactly a full DCT/IDCT round trip on each
+block but without computing the other 62 coefficients.
+"""
+from PIL import Image
+import numpy as np
+
+from .core import DEFAULT_THRESHOLD, _report, load_host
+from .defaults import DEFAULT_ALPHA
+from .encode import save_image
+
+BLOCK_SIZE = 8
+COEFF1 = (3, 4)
+COEFF2 = (4, 3)
+
+# BT.601 luma weights, as used by OpenCV's BGR <-> YCrCb conversion
+LUMA_WEIGHTS = np.array([0.299, 0.587, 0.114], dtype=np.float32)
+
+
+def dct_matrix(n=BLOCK_SIZE):
+    # Orthonormal DCT-II matrix: dct(block) == C @ block @ C.T (as cv2.dct)
+    k = np.arange(n)[:, None]
+    x = np.arange(n)[None, :]
+    matrix = np.sqrt(2.0 / n) * np.cos(np.pi * (2 * x + 1) * k / (2 * n))
+    matrix[0] /= np.sqrt(2.0)
+    return matrix
+
+
+def _coefficient_basis():
+    # (64, 2): column j projects a flattened block onto coefficient j
+    matrix = dct_matrix()
+    basis1 = np.outer(matrix[COEFF1[0]], matrix[COEFF1[1]])
+    basis2 = np.outer(matrix[COEFF2[0]], matrix[COEFF2[1]])
+    return np.stack([basis1.ravel(), basis2.ravel()], axis=1).astype(np.float32)
+
+
+BASIS = _coefficient_basis()
+
+
+def block_grid(pixels):
+    # Number of whole 8x8 blocks down and across; partial edge blocks are skipped
+    return pixels.shape[0] // BLOCK_SIZE, pixels.shape[1] // BLOCK_SIZE
+
+
+def luma(pixels):
+    return pixels[..., :3].astype(np.float32) @ LUMA_WEIGHTS
+
+
+def _blocks(plane, rows, cols):
+    # (rows * cols, 64) matrix of flattened blocks, row-major over the grid
+    plane = plane[:rows * BLOCK_SIZE, :cols * BLOCK_SIZE]
+    blocks = plane.reshape(rows, BLOCK_SIZE, cols, BLOCK_SIZE).swapaxes(1, 2)
+    return blocks.reshape(rows * cols, BLOCK_SIZE * BLOCK_SIZE)
+
+
+def _unblocks(blocks, rows, cols):
+    blocks = blocks.reshape(rows, cols, BLOCK_SIZE, BLOCK_SIZE).swapaxes(1, 2)
+    return blocks.reshape(rows * BLOCK_SIZE, cols * BLOCK_SIZE)
+
+
+def embed_dct_array(pixels, watermark_bits, alpha=DEFAULT_ALPHA):
+    # pixels: (height, width, 3) uint8 RGB; watermark_bits: 0/1 with one bit
+    # per block, shape block_grid(pixels). Returns a new uint8 array.
+    rows, cols = block_grid(pixels)
+    if watermark_bits.shape != (rows, cols):
+        raise ValueError(f"Expected {(rows, cols)} watermark bits, got {watermark_bits.shape}")
+
+    coeffs = _blocks(luma(pixels), rows, cols) @ BASIS
+    average = coeffs.mean(axis=1)
+    strength = alpha * np.abs(average)
+    target = np.where(watermark_bits.ravel().astype(bool), average + strength, average - strength)
+    delta = target[:, None] - coeffs
+
+    # Changing only Y leaves Cr and Cb alone, which adds the same amount
+    # to each of R, G and B. Pixels are integers, so rounding the change
+    # first gives the same result and lets the frame stay in int16.
+    delta_y = np.rint(_unblocks(delta @ BASIS.T, rows, cols)).astype(np.int16)
+    watermarked = pixels[..., :3].astype(np.int16)
+    watermarked[:rows * BLOCK_SIZE, :cols * BLOCK_SIZE] += delta_y[..., None]
+    np.clip(watermarked, 0, 255, out=watermarked)
+    return watermarked.astype(np.uint8)
+
+
+def extract_dct_array(watermarked, original):
+    # (rows, cols) uint8 plane: 255 where the coefficients were pushed up
+    if watermarked.shape != original.shape:
+        raise ValueError("Watermarked and original images must be the same size")
+    rows, cols = block_grid(watermarked)
+    difference = luma(watermarked) - luma(original)
+    coeffs = _blocks(difference, rows, cols) @ BASIS
+    return np.where(coeffs.sum(axis=1) > 0, 255, 0).astype(np.uint8).reshape(rows, cols)
+
+
+def prepare_dct_watermark(watermark_path, grid, threshold=DEFAULT_THRESHOLD):
+    # One bit per block: the watermark is resized to the (rows, cols) grid
+    rows, cols = grid
+    watermark_img = Image.open(watermark_path).convert('L').resize((cols, rows))
+    return (np.asarray(watermark_img) > threshold).astype(np.uint8)
+
+
+def embed_dct(host_path, watermark_path, output_path, alpha=DEFAULT_ALPHA, progress=None,
+              encoder=None):
+    # Lossy output only warns: the mark survives mild compression, though
+    # non-blind extraction then also picks up the compression error
+    _report(progress, 'load')
+    host_pixels = load_host(host_path, progress)
+    height, width = host_pixels.shape[:2]
+    _report(progress, 'resize')
+    watermark_bits = prepare_dct_watermark(watermark_path, block_grid(host_pixels))
+    _report(progress, 'embed')
+    watermarked = embed_dct_array(host_pixels, watermark_bits, alpha)
+    _report(progress, 'encode')
+    save_image(watermarked, output_path, encoder, allow_lossy=True)
+    return width, height
+
+
+def extract_dct(watermarked_path, original_path, output_path, progress=None, encoder=None):
+    _report(progress, 'load')
+    watermarked = load_host(watermarked_path, progress)
+    _report(progress, 'load')
+    original = load_host(original_path, progress)
+    _report(progress, 'extract')
+    secret = extract_dct_array(watermarked, original)
+    _report(progress, 'encode')
+    save_image(secret, output_path, encoder, allow_lossy=True)
+    # The host size, not the block grid's, so throughput figures compare
+    # with the other methods
+    height, width = watermarked.shape[:2]
+    return width, height
@@ -0,0 +1,28 @@
+"""Defaults and choices shared by the CLI and the core modules.
+
+Nothing heavy is imported here, so the CLI can build its argument parser,
+and answer --help or a usage error, without loading numpy or PIL.
+"""
+
+# DCT embedding strength
+DEFAULT_ALPHA = 0.03
+
+# See placement.py for what each mode does
+PLACEMENTS = ('stretch', 'nearest', 'tile', 'center', 'top-left', 'top-right', 'bottom-left',
+              'bottom-right')
+DEFAULT_PLACEMENT = 'stretch'
+
+# Frames buffered between video pipeline stages
+DEFAULT_QUEUE_SIZE = 8
+
+TIFF_COMPRESSIONS = ('raw', 'tiff_deflate', 'tiff_lzw', 'packbits')
+
+
+def parse_shape(text):
+    # '4000x6000' or '4000x6000x3' (height x width [x channels])
+    parts = [int(part) for part in text.lower().split('x')]
+    if len(parts) == 2:
+        parts.append(3)
+    if len(parts) != 3 or parts[2] not in (3, 4):
+        raise ValueError(f"Raw shape must be HEIGHTxWIDTH[x3|x4], got {text!r}")
+    return tuple(parts)
@@ -0,0 +1,107 @@
+"""Lossless output encoding, with per-format speed/size settings."""
+import io
+import os
+import warnings
+from dataclasses import dataclass
+
+from PIL import Image
+
+from .defaults import TIFF_COMPRESSIONS
+
+# WebP is always written in its lossless mode here
+LOSSLESS_FORMATS = {
+    '.png': 'PNG',
+    '.tif': 'TIFF',
+    '.tiff': 'TIFF',
+    '.bmp': 'BMP',
+    '.ppm': 'PPM',
+    '.webp': 'WEBP',
+}
+
+
+class LossyOutputWarning(UserWarning):
+    pass
+
+
+@dataclass(frozen=True)
+class EncodeOptions:
+    # PNG: zlib level 0 (stored, fastest) to 9 (smallest). 6 is PIL's own
+    # default; optimize=True also searches for the smallest encoding and
+    # roughly doubles the time of level 9.
+    compress_level: int = 6
+    optimize: bool = False
+    # TIFF: 'raw' (uncompressed, as fast as BMP) or one of TIFF_COMPRESSIONS
+    tiff_compression: str = 'raw'
+    # Lossless WebP: method 0 (fastest) to 6 (smallest)
+    webp_method: int = 4
+
+    def __post_init__(self):
+        if not 0 <= self.compress_level <= 9:
+            raise ValueError(f"PNG compress level must be 0-9, got {self.compress_level}")
+        if self.tiff_compression not in TIFF_COMPRESSIONS:
+            raise ValueError(f"TIFF compression must be one of {', '.join(TIFF_COMPRESSIONS)}")
+        if not 0 <= self.webp_method <= 6:
+            raise ValueError(f"WebP method must be 0-6, got {self.webp_method}")
+
+    def save_kwargs(self, fmt):
+        if fmt == 'PNG':
+            return {'compress_level': self.compress_level, 'optimize': self.optimize}
+        if fmt == 'TIFF':
+            return {'compression': self.tiff_compression}
+        if fmt == 'WEBP':
+            # In lossless mode quality is the effort spent, not fidelity
+            return {'lossless': True, 'method': self.webp_method,
+                    'quality': self.webp_method * 100 // 6}
+        return {}
+
+
+DEFAULT_ENCODE_OPTIONS = EncodeOptions()
+
+
+def is_lossless(path):
+    # Only the formats above are known to keep every bit; JPEG, GIF
+    # (palette quantisation), JPEG 2000, ICO and the rest may not
+    return path.lower().endswith(tuple(LOSSLESS_FORMATS))
+
+
+def check_lossless(path, allow_lossy=False):
+    # LSB bits do not survive lossy compression. Raises ValueError for any
+    # output path outside LOSSLESS_FORMATS, or only warns when allow_lossy
+    # is set (DCT output, extracted watermarks).
+    if is_lossless(path):
+        return
+    lossless = ', '.join(sorted(LOSSLESS_FORMATS))
+    if not allow_lossy:
+        raise ValueError(f"{os.path.basename(path)} is not a lossless format and would "
+                         f"destroy the LSB watermark; save as one of {lossless}")
+    warnings.warn(f"{os.path.basename(path)} is not a lossless format and may weaken the "
+                  f"watermark; {lossless} keep it intact", LossyOutputWarning, stacklevel=3)
+
+
+def save_image(image, path, options=None, allow_lossy=False):
+    # image is a PIL image or a uint8 array
+    check_lossless(path, allow_lossy)
+    options = options or DEFAULT_ENCODE_OPTIONS
+    if not isinstance(image, Image.Image):
+        image = Image.fromarray(image)
+    fmt = LOSSLESS_FORMATS.get(os.path.splitext(path)[1].lower())
+    if fmt is None:
+        # Anything else is left to PIL's own extension lookup and defaults
+        image.save(path)
+    else:
+        image.save(path, format=fmt, **options.save_kwargs(fmt))
+
+
+def encode_image(image, ext='.png', options=None):
+    # In-memory counterpart of save_image: returns the encoded bytes. Only
+    # the lossless formats are accepted, named by extension ('.png', 'webp').
+    ext = ext.lower() if ext.startswith('.') else '.' + ext.lower()
+    fmt = LOSSLESS_FORMATS.get(ext)
+    if fmt is None:
+        raise ValueError(f"Cannot encode {ext}; use one of {', '.join(sorted(LOSSLESS_FORMATS))}")
+    options = options or DEFAULT_ENCODE_OPTIONS
+    if not isinstance(image, Image.Image):
+        image = Image.fromarray(image)
+    buffer = io.BytesIO()
+    image.save(buffer, format=fmt, **options.save_kwargs(fmt))
+    return buffer.getvalue()
@@ -0,0 +1,304 @@
+"""Robustness evaluation: how well each method's watermark survives attacks.
+
+    python -m digital_watermark evaluate hosts/ -w logo.png -j 8
+    python -m digital_watermark evaluate hosts/ -w logo.png --attacks jpeg:90 resize:0.5
+
+Every host is watermarked in memory with each method, then run through a
+matrix of attacks and the watermark is extracted again. Attacks are
+written KIND[:VALUE]:
+
+    none          the watermarked image as is
+    jpeg:Q        JPEG recompression at quality Q (1-100)
+    resize:S      scaled by S and back to the original size (bilinear)
+    crop:F        a border totalling fraction F of each side cut away and
+                  left black, so the rest stays aligned
+    noise:SIGMA   additive Gaussian noise, SIGMA in 0-255 grey levels
+
+For each attack the bit error rate (BER) and normalised correlation (NC)
+of the extracted bits against the embedded ones are recorded, with the
+PSNR of the attacked image against the watermarked one. For each method
+the PSNR and SSIM of the watermarked image against the host measure how
+visible the mark is. All metrics are computed with whole-array numpy
+operations. (host, method) pairs are spread over a process pool.
+"""
+import io
+import math
+from dataclasses import dataclass, field
+
+import numpy as np
+from PIL import Image
+
+from .core import load_host
+from .dct import luma
+from .defaults import DEFAULT_ALPHA, DEFAULT_PLACEMENT
+from .methods import available_methods, get_method
+
+ATTACK_KINDS = ('none', 'jpeg', 'resize', 'crop', 'noise')
+DEFAULT_ATTACKS = ('none', 'jpeg:95', 'jpeg:90', 'jpeg:75', 'jpeg:50', 'resize:0.75',
+                   'resize:0.5', 'crop:0.1', 'crop:0.25', 'noise:1', 'noise:2', 'noise:5')
+# An attack counts as survived on a host when at most this fraction of bits flipped
+DEFAULT_MAX_BER = 0.1
+
+# SSIM over uniform 7x7 windows with the usual constants for 8-bit images
+SSIM_WINDOW = 7
+SSIM_C1 = (0.01 * 255) ** 2
+SSIM_C2 = (0.03 * 255) ** 2
+# Rows of windows per SSIM step, so large hosts need no full-size float planes
+SSIM_BAND_ROWS = 512
+
+
+@dataclass(frozen=True)
+class Attack:
+    kind: str
+    value: float = None
+
+    @property
+    def name(self):
+        return self.kind if self.value is None else f"{self.kind}:{self.value:g}"
+
+    def apply(self, pixels, seed=0):
+        # Returns a new (height, width, 3) uint8 array the size of pixels
+        if self.kind == 'none':
+            return pixels
+        if self.kind == 'jpeg':
+            buffer = io.BytesIO()
+            Image.fromarray(pixels).save(buffer, format='JPEG', quality=int(self.value))
+            buffer.seek(0)
+            return load_host(buffer)
+        if self.kind == 'resize':
+            height, width = pixels.shape[:2]
+            size = (max(1, round(width * self.value)), max(1, round(height * self.value)))
+            scaled = Image.fromarray(pixels).resize(size, Image.BILINEAR)
+            return np.asarray(scaled.resize((width, height), Image.BILINEAR))
+        if self.kind == 'crop':
+            height, width = pixels.shape[:2]
+            top, left = round(height * self.value / 2), round(width * self.value / 2)
+            attacked = np.zeros_like(pixels)
+            attacked[top:height - top, left:width - left] = pixels[top:height - top,
+                                                                   left:width - left]
+            return attacked
+        noise = np.random.default_rng(seed).standard_normal(pixels.shape, dtype=np.float32)
+        noise *= self.value
+        noise += pixels
+        np.clip(noise, 0, 255, out=noise)
+        return np.rint(noise).astype(np.uint8)
+
+
+def parse_attack(spec):
+    kind, _, value = spec.partition(':')
+    kind = kind.strip().lower()
+    if kind not in ATTACK_KINDS:
+        raise ValueError(f"Unknown attack '{spec}'; use one of {', '.join(ATTACK_KINDS)}")
+    if kind == 'none':
+        if value:
+            raise ValueError("The 'none' attack takes no value")
+        return Attack('none')
+    try:
+        number = float(value)
+    except ValueError:
+        raise ValueError(f"Attack '{spec}' needs a numeric value, e.g. {kind}:{_EXAMPLES[kind]}")
+    low, high, bounds = _LIMITS[kind]
+    if not low <= number <= high or (kind in ('resize', 'crop') and number in (0, 1)):
+        raise ValueError(f"{kind} value must be {bounds}, got {value}")
+    return Attack(kind, number)
+
+
+_EXAMPLES = {'jpeg': '75', 'resize': '0.5', 'crop': '0.1', 'noise': '2'}
+_LIMITS = {
+    'jpeg': (1, 100, 'a quality from 1 to 100'),
+    'resize': (0, 4, 'a scale between 0 and 4, other than 1'),
+    'crop': (0, 1, 'a fraction between 0 and 1'),
+    'noise': (0, 255, 'a standard deviation from 0 to 255'),
+}
+
+
+def bit_error_rate(reference, extracted):
+    # Fraction of bits that differ between two 0/1 planes of the same shape
+    return np.count_nonzero(reference != extracted) / reference.size
+
+
+def normalized_correlation(reference, extracted):
+    # sum(w * w') / sqrt(sum(w^2) * sum(w'^2)) for 0/1 bits; 1.0 when every
+    # set bit of the reference is set in the extraction and vice versa
+    reference = reference.astype(bool)
+    extracted = extracted.astype(bool)
+    denominator = math.sqrt(np.count_nonzero(reference) * np.count_nonzero(extracted))
+    if not denominator:
+        return 0.0
+    return np.count_nonzero(reference & extracted) / denominator
+
+
+def psnr(original, distorted):
+    # In dB over all channels; inf for identical images
+    difference = np.subtract(original, distorted, dtype=np.float32)
+    mse = float(np.mean(np.square(difference, out=difference), dtype=np.float64))
+    return math.inf if mse == 0 else 10 * math.log10(255 ** 2 / mse)
+
+
+def ssim(original, distorted):
+    # Mean SSIM of the luma planes over every 7x7 window, computed a band
+    # of rows at a time from integral images
+    height = original.shape[0]
+    total, count = 0.0, 0
+    for top in range(0, max(1, height - SSIM_WINDOW + 1), SSIM_BAND_ROWS):
+        rows = slice(top, min(height, top + SSIM_BAND_ROWS + SSIM_WINDOW - 1))
+        values = _ssim_map(luma(original[rows]), luma(distorted[rows]))
+        total += float(values.sum())
+        count += values.size
+    return total / count if count else math.nan
+
+
+def _ssim_map(x, y):
+    n = SSIM_WINDOW * SSIM_WINDOW
+    mean_x, mean_y = _window_mean(x), _window_mean(y)
+    # Sample (n - 1) variances and covariance, as scikit-image does
+    scale = n / (n - 1)
+    var_x = (_window_mean(x * x) - mean_x * mean_x) * scale
+    var_y = (_window_mean(y * y) - mean_y * mean_y) * scale
+    cov = (_window_mean(x * y) - mean_x * mean_y) * scale
+    return ((2 * mean_x * mean_y + SSIM_C1) * (2 * cov + SSIM_C2)
+            / ((mean_x * mean_x + mean_y * mean_y + SSIM_C1) * (var_x + var_y + SSIM_C2)))
+
+
+def _window_mean(plane, size=SSIM_WINDOW):
+    # Mean of every size x size window that fits inside plane
+    integral = np.zeros((plane.shape[0] + 1, plane.shape[1] + 1), dtype=np.float64)
+    np.cumsum(plane, axis=0, dtype=np.float64, out=integral[1:, 1:])
+    np.cumsum(integral[1:, 1:], axis=1, out=integral[1:, 1:])
+    sums = (integral[size:, size:] - integral[:-size, size:]
+            - integral[size:, :-size] + integral[:-size, :-size])
+    return sums / (size * size)
+
+
+@dataclass
+class EvaluationOptions:
+    attacks: tuple = tuple(parse_attack(spec) for spec in DEFAULT_ATTACKS)
+    alpha: float = DEFAULT_ALPHA
+    placement: str = DEFAULT_PLACEMENT
+    # Seeds the noise attacks, so repeated runs are comparable
+    seed: int = 0
+
+
+@dataclass
+class EvaluationResult:
+    host_path: str
+    method: str
+    # Watermarked against host: how visible the mark is
+    psnr: float = None
+    ssim: float = None
+    # Attack name -> {'ber', 'nc', 'psnr'}, in the order the attacks ran
+    attacks: dict = field(default_factory=dict)
+    error: str = None
+
+    @property
+    def ok(self):
+        return self.error is None
+
+
+def evaluate_host(host_path, watermark_path, method, options=None):
+    # Runs one host through one method and every attack
+    options = options or EvaluationOptions()
+    evaluator = _evaluator(method)
+    result = EvaluationResult(host_path, method)
+    try:
+        host = load_host(host_path)
+        watermarked, bits = evaluator.embed_array(host, watermark_path, alpha=options.alpha,
+                                                  placement=options.placement)
+        result.psnr = psnr(host, watermarked)
+        result.ssim = ssim(host, watermarked)
+        for attack in options.attacks:
+            attacked = attack.apply(watermarked, options.seed)
+            extracted = evaluator.extract_array(attacked, host)
+            result.attacks[attack.name] = {
+                'ber': bit_error_rate(bits, extracted),
+                'nc': normalized_correlation(bits, extracted),
+                'psnr': psnr(watermarked, attacked),
+            }
+    except Exception as e:
+        result.error = f"{type(e).__name__}: {e}"
+    return result
+
+
+def _evaluate_task(task):
+    return evaluate_host(*task)
+
+
+def evaluable_methods():
+    # Names of the registered methods that can run in memory
+    return [method.name for method in available_methods() if method.in_memory]
+
+
+def _evaluator(name):
+    method = get_method(name)
+    if not method.in_memory:
+        raise ValueError(f"Method '{name}' cannot be evaluated; "
+                         f"available: {', '.join(evaluable_methods())}")
+    return method
+
+
+def run_evaluation(host_paths, watermark_path, methods=None, options=None, workers=1):
+    # Yields an EvaluationResult per (host, method), host by host. methods
+    # defaults to every method that can run in memory. With workers > 1
+    # the pairs run in a process pool.
+    methods = evaluable_methods() if methods is None else methods
+    for method in methods:
+        _evaluator(method)
+    options = options or EvaluationOptions()
+    tasks = ((path, watermark_path, method, options)
+             for path in host_paths for method in methods)
+    if workers <= 1:
+        yield from map(_evaluate_task, tasks)
+        return
+    from concurrent.futures import ProcessPoolExecutor
+    with ProcessPoolExecutor(max_workers=workers) as pool:
+        yield from pool.map(_evaluate_task, tasks)
+
+
+def summarize_evaluation(results, max_ber=DEFAULT_MAX_BER):
+    # One row per (method, attack) in first-seen order: mean BER, NC and
+    # attacked PSNR, and the fraction of hosts with BER <= max_ber. Also
+    # the mean embedding PSNR/SSIM per method.
+    rows = {}
+    methods = {}
+    for result in results:
+        if not result.ok:
+            continue
+        quality = methods.setdefault(result.method, {'hosts': 0, 'psnr': [], 'ssim': []})
+        quality['hosts'] += 1
+        quality['psnr'].append(result.psnr)
+        quality['ssim'].append(result.ssim)
+        for name, metrics in result.attacks.items():
+            rows.setdefault((result.method, name), []).append(metrics)
+    return {
+        'methods': {method: {'hosts': quality['hosts'],
+                             'psnr': _mean(quality['psnr']),
+                             'ssim': _mean(quality['ssim'])}
+                    for method, quality in methods.items()},
+        'attacks': [{'method': method, 'attack': name, 'hosts': len(metrics),
+                     'ber': _mean([m['ber'] for m in metrics]),
+                     'nc': _mean([m['nc'] for m in metrics]),
+                     'psnr': _mean([m['psnr'] for m in metrics]),
+                     'survived': sum(m['ber'] <= max_ber for m in metrics) / len(metrics)}
+                    for (method, name), metrics in rows.items()],
+        'failed': sum(1 for result in results if not result.ok),
+    }
+
+
+def format_summary(summary):
+    # Plain-text table of summarize_evaluation's output
+    lines = [f"{'method':<6} {'attack':<12} {'BER':>7} {'NC':>7} {'PSNR dB':>8} {'survived':>9}"]
+    for row in summary['attacks']:
+        lines.append(f"{row['method']:<6} {row['attack']:<12} {row['ber']:>7.4f} "
+                     f"{row['nc']:>7.4f} {_db(row['psnr']):>8} {row['survived']:>9.0%}")
+    for method, quality in summary['methods'].items():
+        lines.append(f"{method} embedding: PSNR {_db(quality['psnr'])} dB, "
+                     f"SSIM {quality['ssim']:.4f} over {quality['hosts']} hosts")
+    return '\n'.join(lines)
+
+
+def _mean(values):
+    return float(np.mean(values)) if values else math.nan
+
+
+def _db(value):
+    return 'inf' if math.isinf(value) else f"{value:.1f}"
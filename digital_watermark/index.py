@@ -0,0 +1,335 @@
+"""On-disk index of LSB signatures for finding watermarked files in an archive.
+
+Each file's red-channel LSB plane is reduced to two signatures:
+
+* a grid signature: the plane split into SIGNATURE_GRID x SIGNATURE_GRID
+  cells, each set to its majority bit (512 bytes), which is compared with
+  a watermark by Hamming distance. For placements other than 'stretch'
+  the watermark's reference grid depends on the host size, so it is
+  built once per distinct (width, height) in the index;
+* a plane digest: a hash of the full packed plane, equal for files
+  carrying exactly the same bits. find --exact compares it with the plane
+  the watermark would produce at each indexed size, which only matches
+  files whose LSBs were left untouched since the embed.
+
+Signatures live in SQLite keyed by a hash of the file contents, and paths
+remember their mtime and size. Rescans therefore skip unchanged files
+without reading them, and renamed or copied files are never re-analysed.
+"""
+import hashlib
+import os
+import sqlite3
+
+from PIL import Image
+import numpy as np
+
+from .bitplane import CHUNK_ROWS, red_planes
+from .cache import WatermarkCache
+from .core import DEFAULT_THRESHOLD, make_placement
+from .defaults import DEFAULT_PLACEMENT
+from .placement import sample_index
+
+if hasattr(np, 'bitwise_count'):
+    _row_popcount = lambda bits: np.bitwise_count(bits).sum(axis=1, dtype=np.int64)  # noqa: E731
+else:
+    _POPCOUNT = np.array([bin(value).count('1') for value in range(256)], dtype=np.uint8)
+    _row_popcount = lambda bits: _POPCOUNT[bits].sum(axis=1, dtype=np.int64)  # noqa: E731
+
+SIGNATURE_GRID = 64
+READ_BLOCK = 1024 * 1024
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS signatures (
+    content_hash TEXT PRIMARY KEY,
+    width INTEGER NOT NULL,
+    height INTEGER NOT NULL,
+    grid BLOB NOT NULL,
+    plane_digest TEXT NOT NULL
+);
+CREATE TABLE IF NOT EXISTS files (
+    path TEXT PRIMARY KEY,
+    mtime_ns INTEGER NOT NULL,
+    size INTEGER NOT NULL,
+    content_hash TEXT NOT NULL
+);
+CREATE INDEX IF NOT EXISTS files_by_hash ON files (content_hash);
+"""
+
+
+def content_hash(path):
+    digest = hashlib.blake2b(digest_size=16)
+    with open(path, 'rb') as f:
+        for block in iter(lambda: f.read(READ_BLOCK), b''):
+            digest.update(block)
+    return digest.hexdigest()
+
+
+def _edges(size, grid):
+    return (np.arange(grid) * size) // grid
+
+
+def grid_signature(chunks, grid=SIGNATURE_GRID):
+    # Majority bit per cell of a 0/1 plane given as (rows, width) chunks,
+    # top to bottom; returns (width, height, packed signature bytes). An
+    # image narrower or shorter than the grid gets one cell per pixel on
+    # that axis, repeated out to the full grid, since empty cells would
+    # read as bogus zeros.
+    column_sums = []
+    width = 0
+    for bits in chunks:
+        width = bits.shape[1]
+        column_sums.append(np.add.reduceat(bits, _edges(width, min(grid, width)), axis=1,
+                                           dtype=np.int32))
+    column_sums = np.concatenate(column_sums)
+    height = column_sums.shape[0]
+    rows, cols = min(grid, height), min(grid, width)
+    counts = np.add.reduceat(column_sums, _edges(height, rows), axis=0, dtype=np.int64)
+    cell_rows = np.diff(np.append(_edges(height, rows), height))
+    cell_cols = np.diff(np.append(_edges(width, cols), width))
+    majority = counts * 2 > np.outer(cell_rows, cell_cols)
+    if (rows, cols) != (grid, grid):
+        majority = majority[sample_index(grid, rows)][:, sample_index(grid, cols)]
+    return width, height, np.packbits(majority).tobytes()
+
+
+def lsb_signature(path, grid=SIGNATURE_GRID):
+    # Returns (width, height, packed grid signature bytes, plane digest)
+    digest = hashlib.blake2b(digest_size=16)
+
+    def chunks():
+        for top, red in red_planes(path):
+            for start in range(0, red.shape[0], CHUNK_ROWS):
+                bits = red[start:start + CHUNK_ROWS] & 1
+                digest.update(np.packbits(bits, axis=1).tobytes())
+                yield bits
+
+    width, height, signature = grid_signature(chunks(), grid)
+    return width, height, signature, digest.hexdigest()
+
+
+def watermark_signature(watermark_path, grid=SIGNATURE_GRID, threshold=DEFAULT_THRESHOLD,
+                        placement=DEFAULT_PLACEMENT, size=None, cache=None):
+    # What lsb_signature gives for a (width, height) host carrying this
+    # watermark. 'stretch' covers any host the same way, so size is only
+    # needed for the other placements.
+    if placement == 'stretch':
+        watermark_img = Image.open(watermark_path).convert('L').resize((grid, grid))
+        return np.packbits(np.asarray(watermark_img) > threshold).tobytes()
+    if size is None:
+        raise ValueError(f"The '{placement}' placement needs the host size")
+    width, height = size
+    placed = make_placement(watermark_path, width, height, placement, cache, threshold)
+    chunks = (placed.plane(top, min(CHUNK_ROWS, height - top))
+              for top in range(0, height, CHUNK_ROWS))
+    return grid_signature(chunks, grid)[2]
+
+
+def watermark_plane_digest(watermark_path, width, height, placement=DEFAULT_PLACEMENT,
+                           cache=None, threshold=DEFAULT_THRESHOLD):
+    # The plane digest lsb_signature gives for a (width, height) host
+    # carrying this watermark; packbits works row by row, so the chunking
+    # does not change the bytes hashed
+    placed = make_placement(watermark_path, width, height, placement, cache, threshold)
+    digest = hashlib.blake2b(digest_size=16)
+    for top in range(0, height, CHUNK_ROWS):
+        plane = placed.plane(top, min(CHUNK_ROWS, height - top))
+        digest.update(np.packbits(plane, axis=1).tobytes())
+    return digest.hexdigest()
+
+
+def _analyse(path):
+    # Worker: runs in a pool process, so errors come back as values
+    try:
+        stat = os.stat(path)
+        file_hash = content_hash(path)
+        return path, stat.st_mtime_ns, stat.st_size, file_hash, None
+    except Exception as e:
+        return path, None, None, None, f"{type(e).__name__}: {e}"
+
+
+def _signature(path):
+    try:
+        return lsb_signature(path), None
+    except Exception as e:
+        return None, f"{type(e).__name__}: {e}"
+
+
+class SignatureIndex:
+
+    def __init__(self, db_path):
+        self.db_path = db_path
+        self._db = sqlite3.connect(db_path)
+        self._db.executescript(SCHEMA)
+
+    def close(self):
+        self._db.close()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.close()
+
+    def __len__(self):
+        return self._db.execute("SELECT COUNT(*) FROM files").fetchone()[0]
+
+    def scan(self, paths, workers=1, chunksize=16, roots=()):
+        # Returns counts of unchanged, hashed, analysed, failed and removed
+        # files and the error message for each failure. A scanned path that
+        # is gone or now fails loses its entry, as does any indexed file
+        # under one of the roots (the scanned directories) that no longer
+        # exists. Signatures no file refers to any more are dropped.
+        stats = {'unchanged': 0, 'hashed': 0, 'analysed': 0, 'failed': 0, 'removed': 0,
+                 'errors': {}}
+        known = {path: (mtime, size) for path, mtime, size in
+                 self._db.execute("SELECT path, mtime_ns, size FROM files")}
+        changed = []
+        stale = []
+        for path in paths:
+            path = os.path.abspath(path)
+            try:
+                stat = os.stat(path)
+            except OSError as e:
+                stats['failed'] += 1
+                stats['errors'][path] = str(e)
+                stale.append(path)
+                continue
+            if known.get(path) == (stat.st_mtime_ns, stat.st_size):
+                stats['unchanged'] += 1
+            else:
+                changed.append(path)
+
+        with self._pool(workers) as pool:
+            hashed = list(self._map(pool, _analyse, changed, chunksize))
+            have = {row[0] for row in self._db.execute("SELECT content_hash FROM signatures")}
+            # A copy of an already analysed file only needs its path recorded
+            new = {}
+            for path, mtime, size, file_hash, error in hashed:
+                if error is not None:
+                    stats['failed'] += 1
+                    stats['errors'][path] = error
+                    stale.append(path)
+                    continue
+                stats['hashed'] += 1
+                if file_hash not in have:
+                    new.setdefault(file_hash, path)
+            signatures = self._map(pool, _signature, list(new.values()), chunksize)
+            for (file_hash, path), (signature, error) in zip(new.items(), signatures):
+                if error is not None:
+                    stats['failed'] += 1
+                    stats['errors'][path] = error
+                    continue
+                width, height, grid, plane_digest = signature
+                self._db.execute("INSERT OR REPLACE INTO signatures VALUES (?, ?, ?, ?, ?)",
+                                 (file_hash, width, height, grid, plane_digest))
+                have.add(file_hash)
+                stats['analysed'] += 1
+
+        self._db.executemany(
+            "INSERT OR REPLACE INTO files VALUES (?, ?, ?, ?)",
+            [(path, mtime, size, file_hash)
+             for path, mtime, size, file_hash, error in hashed
+             if error is None and file_hash in have])
+        # Including copies of a file whose signature failed
+        stale.extend(path for path, _, _, file_hash, error in hashed
+                     if error is None and file_hash not in have)
+        stale.extend(self._missing_under(roots))
+        before = self._db.total_changes
+        self._db.executemany("DELETE FROM files WHERE path = ?", [(path,) for path in stale])
+        stats['removed'] = self._db.total_changes - before
+        self._db.execute("DELETE FROM signatures WHERE content_hash NOT IN "
+                         "(SELECT content_hash FROM files)")
+        self._db.commit()
+        return stats
+
+    def _missing_under(self, roots):
+        missing = []
+        for root in roots:
+            prefix = os.path.join(os.path.abspath(root), '')
+            for (path,) in self._db.execute(
+                    "SELECT path FROM files WHERE substr(path, 1, ?) = ?", (len(prefix), prefix)):
+                if not os.path.exists(path):
+                    missing.append(path)
+        return missing
+
+    def query(self, watermark_path, min_similarity=0.9, placement=DEFAULT_PLACEMENT):
+        # (path, similarity) for indexed files whose grid signature agrees
+        # with the watermark on at least min_similarity of the cells, best
+        # first. Signatures are compared first and paths looked up only for
+        # the matches. placement must be the one the files were embedded with.
+        rows = self._db.execute(
+            "SELECT content_hash, width, height, grid FROM signatures").fetchall()
+        if not rows:
+            return []
+        if placement == 'stretch':
+            target = np.frombuffer(watermark_signature(watermark_path), dtype=np.uint8)
+        else:
+            cache = WatermarkCache()
+            targets = {}
+            for _, width, height, _ in rows:
+                if (width, height) not in targets:
+                    targets[width, height] = watermark_signature(
+                        watermark_path, placement=placement, size=(width, height), cache=cache)
+            target = np.frombuffer(b''.join(targets[width, height]
+                                            for _, width, height, _ in rows), dtype=np.uint8)
+            target = target.reshape(len(rows), -1)
+        grids = np.frombuffer(b''.join(row[3] for row in rows), dtype=np.uint8)
+        grids = grids.reshape(len(rows), -1)
+        mismatched = _row_popcount(np.bitwise_xor(grids, target))
+        similarity = 1.0 - mismatched / (grids.shape[1] * 8)
+        matches = {rows[i][0]: float(similarity[i])
+                   for i in np.flatnonzero(similarity >= min_similarity)}
+        results = []
+        hashes = list(matches)
+        # Stay under SQLite's limit on bound parameters
+        for start in range(0, len(hashes), 500):
+            batch = hashes[start:start + 500]
+            placeholders = ','.join('?' * len(batch))
+            results.extend(
+                (path, matches[file_hash]) for path, file_hash in self._db.execute(
+                    f"SELECT path, content_hash FROM files WHERE content_hash IN ({placeholders})",
+                    batch))
+        results.sort(key=lambda item: (-item[1], item[0]))
+        return results
+
+    def query_exact(self, watermark_path, placement=DEFAULT_PLACEMENT):
+        # Paths of indexed files whose whole LSB plane is exactly what
+        # embedding this watermark writes, sorted. The expected plane is
+        # built once per distinct (width, height).
+        cache = WatermarkCache()
+        expected = {}
+        hashes = []
+        for file_hash, width, height, plane_digest in self._db.execute(
+                "SELECT content_hash, width, height, plane_digest FROM signatures").fetchall():
+            if (width, height) not in expected:
+                expected[width, height] = watermark_plane_digest(watermark_path, width, height,
+                                                                 placement, cache)
+            if plane_digest == expected[width, height]:
+                hashes.append(file_hash)
+        paths = []
+        for start in range(0, len(hashes), 500):
+            batch = hashes[start:start + 500]
+            placeholders = ','.join('?' * len(batch))
+            paths.extend(path for (path,) in self._db.execute(
+                f"SELECT path FROM files WHERE content_hash IN ({placeholders})", batch))
+        return sorted(paths)
+
+    def _pool(self, workers):
+        if workers > 1:
+            from concurrent.futures import ProcessPoolExecutor
+            return ProcessPoolExecutor(max_workers=workers)
+        return _InlinePool()
+
+    def _map(self, pool, func, items, chunksize):
+        if isinstance(pool, _InlinePool):
+            return map(func, items)
+        return pool.map(func, items, chunksize=chunksize)
+
+
+class _InlinePool:
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        return False
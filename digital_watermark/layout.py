@@ -0,0 +1,226 @@
+"""Multi-bit, multi-channel LSB layouts.
+
+A Layout stores `bits` low bits (1-4) in each of the chosen channels, so
+every pixel carries bits * len(channels) bits. Slots are filled pixel by
+pixel in row-major order, and within a pixel in the order the channels
+are listed; each slot holds its bits most significant first.
+
+Two payloads are supported: a grayscale watermark quantised to as many
+bits per pixel as the layout holds (up to the full 8 bits), and an
+arbitrary byte string prefixed with its length. The 1-bit red-channel
+layout reproduces embed_lsb/extract_lsb exactly.
+"""
+import struct
+from dataclasses import dataclass
+
+from PIL import Image
+import numpy as np
+
+from .core import _check_pixels, _report, load_host
+from .encode import save_image
+
+CHANNEL_NAMES = 'rgb'
+LENGTH_HEADER = struct.Struct('>I')
+
+
+@dataclass(frozen=True)
+class Layout:
+    bits: int = 1
+    channels: tuple = (0,)
+
+    def __post_init__(self):
+        if not 1 <= self.bits <= 4:
+            raise ValueError("Bits per channel must be between 1 and 4")
+        if not self.channels or len(set(self.channels)) != len(self.channels) \
+                or any(c not in (0, 1, 2) for c in self.channels):
+            raise ValueError("Channels must be distinct indices out of 0 (R), 1 (G) and 2 (B)")
+
+    @classmethod
+    def parse(cls, bits, channels='r'):
+        # channels as letters, e.g. 'r', 'rg' or 'rgb'
+        unknown = set(channels.lower()) - set(CHANNEL_NAMES)
+        if unknown:
+            raise ValueError(f"Unknown channel(s) {''.join(sorted(unknown))!r}; use r, g and b")
+        return cls(bits, tuple(CHANNEL_NAMES.index(name) for name in channels.lower()))
+
+    @property
+    def mask(self):
+        return (1 << self.bits) - 1
+
+    @property
+    def bits_per_pixel(self):
+        return self.bits * len(self.channels)
+
+    def capacity(self, width, height):
+        # Payload bytes that fit after the length header
+        return max(0, width * height * self.bits_per_pixel // 8 - LENGTH_HEADER.size)
+
+    def __str__(self):
+        return f"{self.bits}:{''.join(CHANNEL_NAMES[c] for c in self.channels)}"
+
+
+def _flat_pixels(pixels):
+    # (pixels, channels) view; slices of it write straight into pixels
+    _check_pixels(pixels)
+    if not pixels.flags.c_contiguous:
+        raise ValueError("Pixels must be a C-contiguous array to be modified in place")
+    return pixels.reshape(-1, pixels.shape[2])
+
+
+def _write_slot(target, values, layout):
+    np.bitwise_and(target, np.uint8(0xFF ^ layout.mask), out=target)
+    np.bitwise_or(target, values, out=target)
+
+
+# Grayscale watermark ---------------------------------------------------------
+
+def _gray_bits(layout):
+    return min(layout.bits_per_pixel, 8)
+
+
+def embed_gray_array(pixels, gray, layout):
+    # gray: (height, width) uint8 watermark already at the host's size
+    flat = _flat_pixels(pixels)
+    depth = _gray_bits(layout)
+    total = layout.bits_per_pixel
+    # Keep the top `depth` bits, left-aligned in a total-bit field
+    value = (gray.reshape(-1) >> np.uint8(8 - depth)).astype(np.uint16) << (total - depth)
+    for i, channel in enumerate(layout.channels):
+        shift = total - layout.bits * (i + 1)
+        slot = ((value >> shift) & layout.mask).astype(np.uint8)
+        _write_slot(flat[:, channel], slot, layout)
+    return pixels
+
+
+def extract_gray_array(pixels, layout):
+    # Inverse of embed_gray_array, rescaled to the full 0-255 range
+    flat = _flat_pixels(pixels)
+    depth = _gray_bits(layout)
+    total = layout.bits_per_pixel
+    value = np.zeros(flat.shape[0], dtype=np.uint16)
+    for i, channel in enumerate(layout.channels):
+        shift = total - layout.bits * (i + 1)
+        value |= (flat[:, channel] & layout.mask).astype(np.uint16) << shift
+    value >>= total - depth
+    levels = (1 << depth) - 1
+    gray = (value * 255 + levels // 2) // levels
+    return gray.astype(np.uint8).reshape(pixels.shape[:2])
+
+
+# Byte payload ----------------------------------------------------------------
+
+def _bytes_to_slots(data, bits):
+    if 8 % bits == 0:
+        # Each byte splits evenly into 8 / bits slots
+        shifts = np.arange(8 - bits, -1, -bits, dtype=np.uint8)
+        return ((data[:, None] >> shifts) & ((1 << bits) - 1)).reshape(-1)
+    stream = np.unpackbits(data)
+    stream = np.concatenate([stream, np.zeros(-len(stream) % bits, dtype=np.uint8)])
+    stream = stream.reshape(-1, bits)
+    slots = np.zeros(len(stream), dtype=np.uint8)
+    for i in range(bits):
+        slots |= stream[:, i] << np.uint8(bits - 1 - i)
+    return slots
+
+
+def _slots_to_bytes(slots, bits, nbytes):
+    if 8 % bits == 0:
+        per_byte = 8 // bits
+        shifts = np.arange(8 - bits, -1, -bits, dtype=np.uint8)
+        slots = slots[:nbytes * per_byte].reshape(-1, per_byte)
+        return np.bitwise_or.reduce(slots << shifts, axis=1).astype(np.uint8)
+    shifts = np.arange(bits - 1, -1, -1, dtype=np.uint8)
+    stream = ((slots[:, None] >> shifts) & 1).reshape(-1)
+    return np.packbits(stream[:nbytes * 8])
+
+
+def _slot_counts(layout, nslots):
+    # How many of the first nslots land in each channel
+    count = len(layout.channels)
+    return [len(range(i, nslots, count)) for i in range(count)]
+
+
+def _read_slots(flat, layout, nslots):
+    slots = np.empty(nslots, dtype=np.uint8)
+    count = len(layout.channels)
+    for i, (channel, n) in enumerate(zip(layout.channels, _slot_counts(layout, nslots))):
+        np.bitwise_and(flat[:n, channel], layout.mask, out=slots[i::count])
+    return slots
+
+
+def embed_payload_array(pixels, payload, layout):
+    # Writes the length header and payload bytes; pixels past the end keep
+    # their original values
+    flat = _flat_pixels(pixels)
+    data = np.frombuffer(LENGTH_HEADER.pack(len(payload)) + bytes(payload), dtype=np.uint8)
+    capacity = layout.capacity(pixels.shape[1], pixels.shape[0])
+    if len(payload) > capacity:
+        raise ValueError(f"Payload of {len(payload)} bytes exceeds the {capacity} byte "
+                         f"capacity of layout {layout}")
+    slots = _bytes_to_slots(data, layout.bits)
+    count = len(layout.channels)
+    for i, channel in enumerate(layout.channels):
+        values = slots[i::count]
+        _write_slot(flat[:len(values), channel], values, layout)
+    return pixels
+
+
+def extract_payload_array(pixels, layout):
+    flat = _flat_pixels(pixels)
+    header_slots = -(-LENGTH_HEADER.size * 8 // layout.bits)
+    header = _slots_to_bytes(_read_slots(flat, layout, header_slots), layout.bits,
+                             LENGTH_HEADER.size)
+    (length,) = LENGTH_HEADER.unpack(header.tobytes())
+    if length > layout.capacity(pixels.shape[1], pixels.shape[0]):
+        raise ValueError(f"No payload found for layout {layout}")
+    nbytes = LENGTH_HEADER.size + length
+    slots = _read_slots(flat, layout, -(-nbytes * 8 // layout.bits))
+    return _slots_to_bytes(slots, layout.bits, nbytes)[LENGTH_HEADER.size:].tobytes()
+
+
+# Files -----------------------------------------------------------------------
+
+def embed_layered(host_path, watermark_path, output_path, layout, progress=None, encoder=None):
+    _report(progress, 'load')
+    host_pixels = load_host(host_path, progress)
+    height, width = host_pixels.shape[:2]
+    _report(progress, 'resize')
+    watermark_img = Image.open(watermark_path).convert('L').resize((width, height))
+    _report(progress, 'embed')
+    embed_gray_array(host_pixels, np.asarray(watermark_img), layout)
+    _report(progress, 'encode')
+    save_image(host_pixels, output_path, encoder)
+    return width, height
+
+
+def extract_layered(watermarked_path, output_path, layout, progress=None, encoder=None):
+    _report(progress, 'load')
+    pixels = load_host(watermarked_path, progress)
+    _report(progress, 'extract')
+    extracted_img = Image.fromarray(extract_gray_array(pixels, layout))
+    _report(progress, 'encode')
+    save_image(extracted_img, output_path, encoder, allow_lossy=True)
+    return extracted_img.size
+
+
+def embed_payload(host_path, payload_path, output_path, layout, progress=None, encoder=None):
+    _report(progress, 'load')
+    host_pixels = load_host(host_path, progress)
+    with open(payload_path, 'rb') as f:
+        payload = f.read()
+    _report(progress, 'embed')
+    embed_payload_array(host_pixels, payload, layout)
+    _report(progress, 'encode')
+    save_image(host_pixels, output_path, encoder)
+    return host_pixels.shape[1], host_pixels.shape[0]
+
+
+def extract_payload(watermarked_path, output_path, layout, progress=None):
+    _report(progress, 'load')
+    pixels = load_host(watermarked_path, progress)
+    _report(progress, 'extract')
+    payload = extract_payload_array(pixels, layout)
+    _report(progress, 'encode')
+    with open(output_path, 'wb') as f:
+        f.write(payload)
+    return pixels.shape[1], pixels.shape[0]
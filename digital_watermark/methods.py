@@ -0,0 +1,204 @@
+"""Registry of watermarking methods behind one embed/extract interface.
+
+Every method reports the same stages through its progress callback:
+'load' (decode), 'convert' (to an RGB array), 'resize' (watermark
+preparation), 'embed' or 'extract', and 'encode'. Method.embed and
+Method.extract run the method with a StageTimer attached and return the
+seconds spent in each stage next to the result, so the GUI, CLI and batch
+runner all get the same breakdown without timing anything themselves.
+
+Methods may also provide an in-memory pair, embed_array and
+extract_array, which the robustness evaluation runs without touching the
+disk.
+
+New methods are added with register_method; the GUI builds its method
+buttons and the CLI its --method choices from the registry.
+"""
+import time
+
+from .defaults import DEFAULT_ALPHA, DEFAULT_PLACEMENT
+
+STAGES = ('load', 'convert', 'resize', 'embed', 'extract', 'compare', 'encode')
+
+
+class StageTimer:
+    # Progress callback that times stages: each stage runs from its report
+    # until the next report or finish(). Repeated stages (e.g. two images
+    # loaded for DCT extraction) accumulate. Reports are passed on to an
+    # optional chained callback first, so it can still cancel the job.
+
+    def __init__(self, progress=None, clock=time.perf_counter):
+        self.stages = {}
+        self._progress = progress
+        self._clock = clock
+        self._stage = None
+        self._started = None
+
+    def __call__(self, stage):
+        if self._progress is not None:
+            self._progress(stage)
+        self._close()
+        self._stage = stage
+        self._started = self._clock()
+
+    def finish(self):
+        self._close()
+        return dict(self.stages)
+
+    def _close(self):
+        if self._stage is not None:
+            elapsed = self._clock() - self._started
+            self.stages[self._stage] = self.stages.get(self._stage, 0.0) + elapsed
+            self._stage = None
+
+
+def format_stages(stages):
+    # 'load 12.0 ms, convert 3.1 ms, ...' in pipeline order
+    ordered = sorted(stages, key=lambda s: STAGES.index(s) if s in STAGES else len(STAGES))
+    return ', '.join(f"{stage} {stages[stage] * 1000:.1f} ms" for stage in ordered)
+
+
+class Method:
+    # embed(host_path, watermark_path, output_path, progress, encoder, **params)
+    # and extract(watermarked_path, output_path, original_path, progress,
+    # encoder, **params) return the (width, height) processed. params names
+    # the keyword options the method understands (e.g. 'alpha'); others are
+    # dropped, so callers can pass every option they have. lossless_only
+    # marks methods whose marks any lossy output destroys.
+    #
+    # The optional embed_array(host, watermark_path, **params) returns the
+    # watermarked copy of an (height, width, 3) array and the 0/1 bits it
+    # embedded; extract_array(watermarked, host) returns the bits read back.
+
+    def __init__(self, name, label, embed, extract, params=(), needs_original=False,
+                 lossless_only=False, embed_array=None, extract_array=None):
+        self.name = name
+        self.label = label
+        self.params = tuple(params)
+        self.needs_original = needs_original
+        self.lossless_only = lossless_only
+        self._embed = embed
+        self._extract = extract
+        self._embed_array = embed_array
+        self._extract_array = extract_array
+
+    def __repr__(self):
+        return f"Method({self.name!r})"
+
+    def embed(self, host_path, watermark_path, output_path, progress=None, encoder=None,
+              **params):
+        # Returns ((width, height), stage seconds)
+        timer = StageTimer(progress)
+        size = self._embed(host_path, watermark_path, output_path, progress=timer,
+                           encoder=encoder, **self._select(params))
+        return size, timer.finish()
+
+    def extract(self, watermarked_path, output_path, original_path=None, progress=None,
+                encoder=None, **params):
+        if self.needs_original and not original_path:
+            raise ValueError(f"{self.name.upper()} extraction needs the original host image")
+        timer = StageTimer(progress)
+        size = self._extract(watermarked_path, output_path, original_path, progress=timer,
+                             encoder=encoder, **self._select(params))
+        return size, timer.finish()
+
+    @property
+    def in_memory(self):
+        return self._embed_array is not None and self._extract_array is not None
+
+    def embed_array(self, host, watermark_path, **params):
+        self._check_in_memory()
+        return self._embed_array(host, watermark_path, **self._select(params))
+
+    def extract_array(self, watermarked, host):
+        self._check_in_memory()
+        return self._extract_array(watermarked, host)
+
+    def _check_in_memory(self):
+        if not self.in_memory:
+            raise ValueError(f"{self.name.upper()} watermarking cannot run in memory")
+
+    def _select(self, params):
+        return {name: value for name, value in params.items()
+                if name in self.params and value is not None}
+
+
+_methods = {}
+
+
+def register_method(method):
+    if method.name in _methods:
+        raise ValueError(f"Method '{method.name}' is already registered")
+    _methods[method.name] = method
+    return method
+
+
+def get_method(name):
+    try:
+        return _methods[name]
+    except KeyError:
+        raise ValueError(f"Unknown method '{name}'; available: {', '.join(_methods)}")
+
+
+def available_methods():
+    # In registration order, which is also the GUI's button order
+    return list(_methods.values())
+
+
+# The built-in methods import core and dct on first use, so the registry
+# (and the CLI's --method choices) can be loaded without numpy or PIL
+
+def _embed_lsb(host_path, watermark_path, output_path, progress=None, encoder=None, **params):
+    from .core import embed_lsb
+    return embed_lsb(host_path, watermark_path, output_path, progress=progress,
+                     encoder=encoder, **params)
+
+
+def _extract_lsb(watermarked_path, output_path, original_path, progress=None, encoder=None):
+    # LSB extraction is blind; the original is not needed
+    from .core import extract_lsb
+    return extract_lsb(watermarked_path, output_path, progress=progress, encoder=encoder)
+
+
+def _embed_dct(host_path, watermark_path, output_path, progress=None, encoder=None, **params):
+    from .dct import embed_dct
+    return embed_dct(host_path, watermark_path, output_path, progress=progress,
+                     encoder=encoder, **params)
+
+
+def _extract_dct(watermarked_path, output_path, original_path, progress=None, encoder=None):
+    from .dct import extract_dct
+    return extract_dct(watermarked_path, original_path, output_path, progress=progress,
+                       encoder=encoder)
+
+
+def _embed_lsb_array(host, watermark_path, cache=None, placement=DEFAULT_PLACEMENT):
+    from .core import make_placement
+    height, width = host.shape[:2]
+    placed = make_placement(watermark_path, width, height, placement, cache)
+    watermarked = host.copy()
+    placed.embed_rows(watermarked[..., 0])
+    return watermarked, placed.plane()
+
+
+def _extract_lsb_array(watermarked, host):
+    return watermarked[..., 0] & 1
+
+
+def _embed_dct_array(host, watermark_path, alpha=DEFAULT_ALPHA):
+    from .dct import block_grid, embed_dct_array, prepare_dct_watermark
+    bits = prepare_dct_watermark(watermark_path, block_grid(host))
+    return embed_dct_array(host, bits, alpha), bits
+
+
+def _extract_dct_array(watermarked, host):
+    from .dct import extract_dct_array
+    return extract_dct_array(watermarked, host) > 0
+
+
+register_method(Method('lsb', 'LSB (Simple)', _embed_lsb, _extract_lsb,
+                       params=('cache', 'placement'), lossless_only=True,
+                       embed_array=_embed_lsb_array, extract_array=_extract_lsb_array))
+register_method(Method('dct', 'DCT (Robust)', _embed_dct, _extract_dct,
+                       params=('alpha',), needs_original=True,
+                       embed_array=_embed_dct_array, extract_array=_extract_dct_array))
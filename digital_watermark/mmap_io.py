@@ -0,0 +1,177 @@
+"""Memory-mapped LSB embed/extract for uncompressed frames.
+
+.npy arrays, uncompressed BMP/PPM/TIFF files and headerless raw RGB
+dumps are opened with numpy.memmap, and the red-channel LSBs are read or
+rewritten directly in the mapped file. There is no decode/encode round
+trip and the host pixels are never copied into process memory.
+"""
+import os
+import shutil
+
+import numpy as np
+
+from .core import _report, embed_lsb_pixels, extract_lsb_array, make_placement
+from .defaults import DEFAULT_PLACEMENT
+from .encode import save_image
+from .rawio import raw_layout
+
+RAW_EXTENSIONS = ('.raw', '.rgb')
+
+
+class MappedImage:
+    # A file whose pixels are exposed as one or more (rows, width, bpp)
+    # memmap views, top to bottom, each paired with its first row index
+
+    def __init__(self, width, height, red_index, views, mmap):
+        self.width = width
+        self.height = height
+        self.red_index = red_index
+        self.views = views
+        self._mmap = mmap
+
+    def red_planes(self):
+        # (top, view) pairs over the red channel; views write through to the file
+        for top, view in self.views:
+            yield top, view[..., self.red_index]
+
+    def flush(self):
+        if self._mmap is not None and self._mmap.mode != 'r':
+            self._mmap.flush()
+
+    def close(self):
+        self.flush()
+        self.views = []
+        self._mmap = None
+
+
+def open_mapped(path, mode='r', raw_shape=None):
+    # mode is 'r' (read-only) or 'r+' (writes go to the file)
+    ext = os.path.splitext(path)[1].lower()
+    if ext == '.npy':
+        pixels = np.load(path, mmap_mode=mode)
+        if pixels.ndim != 3 or pixels.shape[2] < 3 or pixels.dtype != np.uint8:
+            raise ValueError(f"{path}: expected an (height, width, 3) uint8 array")
+        height, width = pixels.shape[:2]
+        return MappedImage(width, height, 0, [(0, pixels)], pixels)
+
+    if ext in RAW_EXTENSIONS:
+        if raw_shape is None:
+            raise ValueError(f"{path}: headerless raw input needs a shape (HEIGHTxWIDTHxC)")
+        height, width, channels = raw_shape
+        pixels = np.memmap(path, dtype=np.uint8, mode=mode, shape=(height, width, channels))
+        return MappedImage(width, height, 0, [(0, pixels)], pixels)
+
+    layout = raw_layout(path)
+    if layout is None:
+        raise ValueError(f"{path}: not an uncompressed RGB image, cannot memory-map it")
+    data = np.memmap(path, dtype=np.uint8, mode=mode)
+    views = []
+    for segment in layout.segments:
+        rows = segment.bottom - segment.top
+        block = data[segment.offset:segment.offset + rows * segment.stride]
+        block = block.reshape(rows, segment.stride)[:, :layout.width * layout.bytes_per_pixel]
+        block = block.reshape(rows, layout.width, layout.bytes_per_pixel)
+        if segment.bottom_up:
+            block = block[::-1]
+        views.append((segment.top, block))
+    return MappedImage(layout.width, layout.height, layout.rgb_order[0], views, data)
+
+
+def embed_lsb_mapped(host_path, watermark_path, output_path=None, cache=None, raw_shape=None,
+                     progress=None, placement=DEFAULT_PLACEMENT):
+    # With output_path=None the host file itself is watermarked in place;
+    # otherwise it is copied byte for byte and the copy is modified. The
+    # copy is made under a temporary name next to the output and only
+    # renamed once embedded, so a host that cannot be mapped leaves no
+    # unwatermarked file behind.
+    if output_path is None or os.path.abspath(output_path) == os.path.abspath(host_path):
+        return _embed_mapped_file(host_path, watermark_path, cache, raw_shape, progress,
+                                  placement)
+    root, ext = os.path.splitext(output_path)
+    if ext.lower() != os.path.splitext(host_path)[1].lower():
+        raise ValueError("Memory-mapped output must use the same format as the input")
+    # Fails early, with the host's name, if it cannot be mapped at all
+    open_mapped(host_path, 'r', raw_shape).close()
+    # The extension is kept, since open_mapped goes by it
+    temp_path = f"{root}.{os.getpid()}.tmp{ext}"
+    try:
+        shutil.copyfile(host_path, temp_path)
+        size = _embed_mapped_file(temp_path, watermark_path, cache, raw_shape, progress,
+                                  placement)
+        os.replace(temp_path, output_path)
+    except BaseException:
+        try:
+            os.remove(temp_path)
+        except OSError:
+            pass
+        raise
+    return size
+
+
+def _embed_mapped_file(path, watermark_path, cache, raw_shape, progress, placement):
+    _report(progress, 'load')
+    mapped = open_mapped(path, 'r+', raw_shape)
+    try:
+        width, height = mapped.width, mapped.height
+        _report(progress, 'resize')
+        placed = make_placement(watermark_path, width, height, placement, cache)
+
+        _report(progress, 'embed')
+        for top, red in mapped.red_planes():
+            placed.embed_rows(red, top)
+        _report(progress, 'encode')
+        mapped.flush()
+    finally:
+        mapped.close()
+    return width, height
+
+
+def embed_lsb_converted(host_path, watermark_path, output_path, cache=None, raw_shape=None,
+                        progress=None, encoder=None, placement=DEFAULT_PLACEMENT):
+    # For an .npy or raw host written out in another format (.png, or
+    # .npy from raw):
+    # the pixels are read through the map into memory once, watermarked
+    # there and encoded by PIL
+    _report(progress, 'load')
+    mapped = open_mapped(host_path, 'r', raw_shape)
+    try:
+        _report(progress, 'convert')
+        pixels = np.empty((mapped.height, mapped.width, 3), dtype=np.uint8)
+        for top, view in mapped.views:
+            rgb = view[..., 2::-1] if mapped.red_index == 2 else view[..., :3]
+            pixels[top:top + view.shape[0]] = rgb
+    finally:
+        mapped.close()
+    embed_lsb_pixels(pixels, watermark_path, cache, progress, placement)
+    _report(progress, 'encode')
+    if output_path.lower().endswith('.npy'):
+        np.save(output_path, pixels)
+    else:
+        save_image(pixels, output_path, encoder)
+    return pixels.shape[1], pixels.shape[0]
+
+
+def extract_lsb_mapped(watermarked_path, output_path, raw_shape=None, progress=None,
+                       encoder=None):
+    # Output goes to a memory-mapped .npy, or is encoded by PIL otherwise
+    _report(progress, 'load')
+    mapped = open_mapped(watermarked_path, 'r', raw_shape)
+    try:
+        width, height = mapped.width, mapped.height
+        _report(progress, 'extract')
+        if output_path.lower().endswith('.npy'):
+            extracted = np.lib.format.open_memmap(output_path, mode='w+', dtype=np.uint8,
+                                                  shape=(height, width))
+        else:
+            extracted = np.empty((height, width), dtype=np.uint8)
+        for top, red in mapped.red_planes():
+            rows = red.shape[0]
+            extract_lsb_array(red[..., None], out=extracted[top:top + rows])
+        _report(progress, 'encode')
+        if isinstance(extracted, np.memmap):
+            extracted.flush()
+        else:
+            save_image(extracted, output_path, encoder, allow_lossy=True)
+    finally:
+        mapped.close()
+    return width, height
@@ -0,0 +1,157 @@
+"""Where and how the watermark lands on the host.
+
+'stretch' is the original behaviour: the watermark is resized smoothly to
+the full host size and thresholded, which builds a full-resolution
+grayscale image first. The other modes threshold the watermark once at
+its own resolution and write it into the host's red channel row range by
+row range, broadcasting it through strided views, so no full-size
+intermediate is allocated:
+
+    nearest       scaled to the host with nearest-neighbour sampling
+    tile          repeated at its own size across the whole host
+    center, top-left, top-right, bottom-left, bottom-right
+                  placed once at its own size; LSBs elsewhere are cleared
+
+A watermark larger than the host is cropped in the fixed placements.
+"""
+import numpy as np
+from numpy.lib.stride_tricks import as_strided
+
+from .defaults import PLACEMENTS
+
+
+class Placement:
+    # bits is the thresholded 0/1 watermark: at host size for 'stretch', at
+    # its own size for every other mode. embed_rows writes host rows
+    # [top, top + rows) into a (rows, width) uint8 view in place, so full
+    # images, memory-mapped chunks and streamed strips all share it.
+
+    def __init__(self, bits, mode, width, height):
+        if mode not in PLACEMENTS:
+            raise ValueError(f"Unknown placement '{mode}'; use one of {', '.join(PLACEMENTS)}")
+        self.mode = mode
+        self.width = width
+        self.height = height
+        wm_height, wm_width = bits.shape
+        if mode == 'stretch':
+            if bits.shape != (height, width):
+                raise ValueError("A stretched watermark must already match the host size")
+        elif mode == 'nearest':
+            # Integer scale factors allow a pure broadcast with no gather
+            self._factors = (height // wm_height if height % wm_height == 0 else 0,
+                             width // wm_width if width % wm_width == 0 else 0)
+            self._source_rows = sample_index(height, wm_height)
+            self._columns = sample_index(width, wm_width)
+        elif mode == 'tile':
+            self._columns = np.arange(width, dtype=np.intp) % wm_width
+        else:
+            bits, self._origin = _fixed_region(bits, mode, width, height)
+        self.bits = bits
+        self._band = None
+
+    def embed_rows(self, red, top=0):
+        np.bitwise_and(red, 0xFE, out=red)
+        self._or_rows(red, top)
+        return red
+
+    def plane(self, top=0, rows=None):
+        # The 0/1 bits embed_rows writes for these rows, as (rows, width);
+        # used for verification, one chunk at a time
+        rows = self.height - top if rows is None else rows
+        out = np.zeros((rows, self.width), dtype=np.uint8)
+        self._or_rows(out, top)
+        return out
+
+    def _or_rows(self, red, top):
+        rows = red.shape[0]
+        if self.mode == 'stretch':
+            np.bitwise_or(red, self.bits[top:top + rows], out=red)
+        elif self.mode == 'nearest':
+            self._or_nearest(red, top)
+        elif self.mode == 'tile':
+            self._or_tiled(red, top)
+        else:
+            y, x = self._origin
+            height, width = self.bits.shape
+            start, stop = max(top, y), min(top + rows, y + height)
+            if start < stop:
+                region = red[start - top:stop - top, x:x + width]
+                np.bitwise_or(region, self.bits[start - y:stop - y], out=region)
+
+    def _or_nearest(self, red, top):
+        rows = red.shape[0]
+        fy, fx = self._factors
+        if fy and fx and top % fy == 0 and rows % fy == 0:
+            # Each watermark pixel covers an fy x fx block of the host
+            first = top // fy
+            blocks = _split(red, fy, fx)
+            np.bitwise_or(blocks, self.bits[first:first + rows // fy, None, :, None], out=blocks)
+            return
+        # Otherwise widen each watermark row once and broadcast it down the
+        # run of host rows that samples it
+        band = self._column_band()
+        source = self._source_rows[top:top + rows]
+        starts = np.flatnonzero(np.diff(source)) + 1
+        for start, stop in zip(np.r_[0, starts], np.r_[starts, rows]):
+            np.bitwise_or(red[start:stop], band[source[start]], out=red[start:stop])
+
+    def _or_tiled(self, red, top):
+        band = self._column_band()
+        tile_height = band.shape[0]
+        rows = red.shape[0]
+        y = 0
+        offset = top % tile_height
+        if offset:
+            # Finish the tile the previous row range started
+            y = min(rows, tile_height - offset)
+            np.bitwise_or(red[:y], band[offset:offset + y], out=red[:y])
+        whole = (rows - y) // tile_height
+        if whole:
+            tiles = _split(red[y:y + whole * tile_height], tile_height)
+            np.bitwise_or(tiles, band, out=tiles)
+            y += whole * tile_height
+        if y < rows:
+            np.bitwise_or(red[y:], band[:rows - y], out=red[y:])
+
+    def _column_band(self):
+        # The watermark's rows already spread across the host width:
+        # (watermark height, host width), built once
+        if self._band is None:
+            self._band = self.bits[:, self._columns]
+        return self._band
+
+
+def sample_index(size, source_size):
+    # Centre of each destination pixel mapped back onto the source grid
+    index = (2 * np.arange(size, dtype=np.int64) + 1) * source_size // (2 * size)
+    return index.astype(np.intp)
+
+
+def _fixed_region(bits, mode, width, height):
+    # Crops bits to fit the host and returns (bits, (top, left))
+    wm_height, wm_width = bits.shape
+    crop_height, crop_width = min(wm_height, height), min(wm_width, width)
+    if mode == 'center':
+        row = (wm_height - crop_height) // 2
+        col = (wm_width - crop_width) // 2
+        origin = ((height - crop_height) // 2, (width - crop_width) // 2)
+    else:
+        vertical, horizontal = mode.split('-')
+        row = col = 0
+        origin = (0 if vertical == 'top' else height - crop_height,
+                  0 if horizontal == 'left' else width - crop_width)
+    return bits[row:row + crop_height, col:col + crop_width], origin
+
+
+def _split(plane, block_rows, block_cols=None):
+    # Views a (rows, width) plane as (rows // block_rows, block_rows, width),
+    # or as (.., block_rows, width // block_cols, block_cols) blocks, without
+    # a copy even when plane is a strided channel view. reshape could
+    # silently copy, and the in-place writes would then be lost.
+    rows, width = plane.shape
+    row_stride, col_stride = plane.strides
+    if block_cols is None:
+        return as_strided(plane, (rows // block_rows, block_rows, width),
+                          (row_stride * block_rows, row_stride, col_stride))
+    return as_strided(plane, (rows // block_rows, block_rows, width // block_cols, block_cols),
+                      (row_stride * block_rows, row_stride, col_stride * block_cols, col_stride))
@@ -0,0 +1,146 @@
+"""Small preview images, decoded at reduced size and cached in memory and on disk."""
+import hashlib
+import io
+import os
+import threading
+from collections import OrderedDict
+
+from PIL import Image
+
+PREVIEW_SIZE = (300, 300)
+DEFAULT_MEMORY_ITEMS = 128
+DEFAULT_DISK_BYTES = 64 * 1024 * 1024
+# Pruning goes this far below the cap, so it is not repeated on every write
+DISK_PRUNE_TO = 0.8
+
+
+def default_cache_dir():
+    base = os.environ.get('XDG_CACHE_HOME') or os.path.join(os.path.expanduser('~'), '.cache')
+    return os.path.join(base, 'digital_watermark', 'previews')
+
+
+def make_thumbnail(image_path, size=PREVIEW_SIZE):
+    # PNG bytes no larger than size, keeping the aspect ratio. draft() lets
+    # JPEG decode straight at 1/2, 1/4 or 1/8 scale, so a 50 MP photo is
+    # never decoded at full resolution just to be shown at 300 px.
+    with Image.open(image_path) as img:
+        img.draft('RGB', size)
+        img.thumbnail(size)
+        if img.mode not in ('RGB', 'RGBA', 'L'):
+            img = img.convert('RGBA' if 'A' in img.getbands() else 'RGB')
+        buffer = io.BytesIO()
+        img.save(buffer, format='PNG', compress_level=1)
+    return buffer.getvalue()
+
+
+class PreviewCache:
+    # Previews are keyed by path, modification time, file size and preview
+    # size, so an edited file gets a fresh preview. Recent ones stay in an
+    # in-memory LRU and are also kept as PNG files under cache_dir (pass
+    # cache_dir=False to keep them in memory only). Once the files pass
+    # max_disk_bytes, the least recently used are deleted by mtime; reads
+    # touch a file's mtime.
+
+    def __init__(self, cache_dir=None, max_items=DEFAULT_MEMORY_ITEMS,
+                 max_disk_bytes=DEFAULT_DISK_BYTES):
+        self.cache_dir = default_cache_dir() if cache_dir is None else cache_dir
+        self.max_items = max_items
+        self.max_disk_bytes = max_disk_bytes
+        self._memory = OrderedDict()
+        self._lock = threading.Lock()
+        # Bytes on disk as last scanned plus what this process wrote since;
+        # None until the first write scans the directory
+        self._disk_bytes = None
+        self._disk_lock = threading.Lock()
+
+    def get(self, image_path, size=PREVIEW_SIZE):
+        key = self._key(image_path, size)
+        with self._lock:
+            data = self._memory.get(key)
+            if data is not None:
+                self._memory.move_to_end(key)
+                return data
+
+        data = self._read_disk(key)
+        if data is None:
+            data = make_thumbnail(image_path, size)
+            self._write_disk(key, data)
+        self._remember(key, data)
+        return data
+
+    def _key(self, image_path, size):
+        stat = os.stat(image_path)
+        identity = f"{os.path.realpath(image_path)}|{stat.st_mtime_ns}|{stat.st_size}|{size[0]}x{size[1]}"
+        return hashlib.sha1(identity.encode('utf-8')).hexdigest()
+
+    def _remember(self, key, data):
+        with self._lock:
+            self._memory[key] = data
+            self._memory.move_to_end(key)
+            while len(self._memory) > self.max_items:
+                self._memory.popitem(last=False)
+
+    def _disk_path(self, key):
+        return os.path.join(self.cache_dir, key[:2], key + '.png')
+
+    def _read_disk(self, key):
+        if not self.cache_dir:
+            return None
+        path = self._disk_path(key)
+        try:
+            with open(path, 'rb') as f:
+                data = f.read()
+            os.utime(path)
+        except OSError:
+            return None
+        return data
+
+    def _write_disk(self, key, data):
+        if not self.cache_dir:
+            return
+        path = self._disk_path(key)
+        try:
+            os.makedirs(os.path.dirname(path), exist_ok=True)
+            # Write then rename so a concurrent reader never sees half a file
+            temp_path = f"{path}.{os.getpid()}.{threading.get_ident()}.tmp"
+            with open(temp_path, 'wb') as f:
+                f.write(data)
+            os.replace(temp_path, path)
+        except OSError:
+            # The disk cache is only an optimisation
+            return
+        with self._disk_lock:
+            if self._disk_bytes is None:
+                self._prune_disk()
+            else:
+                self._disk_bytes += len(data)
+                if self._disk_bytes > self.max_disk_bytes:
+                    self._prune_disk()
+
+    def _prune_disk(self):
+        # Rescans the directory (other processes share it) and deletes the
+        # oldest previews until they fit in DISK_PRUNE_TO of the cap
+        entries = []
+        for dirpath, _, names in os.walk(self.cache_dir):
+            for name in names:
+                if not name.endswith('.png'):
+                    continue
+                path = os.path.join(dirpath, name)
+                try:
+                    stat = os.stat(path)
+                except OSError:
+                    continue
+                entries.append((stat.st_mtime_ns, stat.st_size, path))
+        total = sum(size for _, size, _ in entries)
+        if total > self.max_disk_bytes:
+            entries.sort()
+            target = self.max_disk_bytes * DISK_PRUNE_TO
+            for _, size, path in entries:
+                if total <= target:
+                    break
+                try:
+                    os.remove(path)
+                except OSError:
+                    continue
+                total -= size
+        self._disk_bytes = total
@@ -0,0 +1,94 @@
+"""Locate uncompressed RGB pixel data inside BMP, PPM and TIFF files.
+
+When an image is stored without compression its rows can be read (or
+memory-mapped) straight from the file, one strip at a time, instead of
+decoding the whole frame.
+"""
+from contextlib import contextmanager
+from dataclasses import dataclass
+
+from PIL import Image
+
+# PIL raw modes we can map directly: bytes per pixel and the byte order
+# of the R, G and B samples within a pixel
+RAW_MODES = {
+    'RGB': (3, (0, 1, 2)),
+    'BGR': (3, (2, 1, 0)),
+    'RGBX': (4, (0, 1, 2)),
+    'RGBA': (4, (0, 1, 2)),
+    'BGRX': (4, (2, 1, 0)),
+    'BGRA': (4, (2, 1, 0)),
+}
+
+
+@dataclass
+class RawSegment:
+    # Rows [top, bottom) of the image live at offset, stride bytes apart;
+    # bottom_up segments store their last row first (as BMP does)
+    top: int
+    bottom: int
+    offset: int
+    stride: int
+    bottom_up: bool
+
+    def row_offset(self, y):
+        index = (self.bottom - 1 - y) if self.bottom_up else (y - self.top)
+        return self.offset + index * self.stride
+
+
+@dataclass
+class RawLayout:
+    width: int
+    height: int
+    bytes_per_pixel: int
+    rgb_order: tuple
+    segments: list
+
+    def segment_for(self, y):
+        for segment in self.segments:
+            if segment.top <= y < segment.bottom:
+                return segment
+        raise IndexError(f"Row {y} is outside the image")
+
+
+@contextmanager
+def open_unbounded(path):
+    # Gigapixel inputs trip PIL's decompression-bomb guard on open; the
+    # streaming and memory-mapped paths never decode them in one go
+    limit = Image.MAX_IMAGE_PIXELS
+    Image.MAX_IMAGE_PIXELS = None
+    try:
+        with Image.open(path) as img:
+            yield img
+    finally:
+        Image.MAX_IMAGE_PIXELS = limit
+
+
+def raw_layout(path):
+    # Returns a RawLayout, or None if the file is compressed or its pixels
+    # are not in a byte-aligned RGB layout
+    with open_unbounded(path) as img:
+        width, height = img.size
+        tiles = list(img.tile)
+    if not tiles:
+        return None
+
+    segments = []
+    bytes_per_pixel = rgb_order = None
+    for decoder, box, offset, args in tiles:
+        if decoder != 'raw' or box[0] != 0 or box[2] != width:
+            return None
+        if isinstance(args, str):
+            args = (args, 0, 1)
+        rawmode, stride, orientation = (tuple(args) + (0, 1))[:3]
+        if rawmode not in RAW_MODES:
+            return None
+        bpp, order = RAW_MODES[rawmode]
+        if bytes_per_pixel is not None and (bpp, order) != (bytes_per_pixel, rgb_order):
+            return None
+        bytes_per_pixel, rgb_order = bpp, order
+        segments.append(RawSegment(box[1], box[3], offset, stride or width * bpp,
+                                   orientation < 0))
+
+    segments.sort(key=lambda segment: segment.top)
+    return RawLayout(width, height, bytes_per_pixel, rgb_order, segments)
@@ -0,0 +1,405 @@
+"""Asyncio HTTP service for embed/extract/verify on in-memory images.
+
+    python -m digital_watermark serve -w logo.png --port 8080 -j 4
+    curl --data-binary @photo.png 'http://127.0.0.1:8080/embed' -o marked.png
+    curl --data-binary @marked.png 'http://127.0.0.1:8080/verify'
+    curl 'http://127.0.0.1:8080/metrics'
+
+Routes (the request body is the encoded image):
+
+    POST /embed?watermark=NAME&format=png    watermarked image
+    POST /extract?format=png                 extracted LSB plane as an image
+    POST /verify?watermark=NAME&min_score=   JSON score, size and match
+    GET  /metrics                            latency histograms and queue state
+    GET  /health
+
+Watermarks are registered by name when the service starts, so requests
+never upload them. Decoding, embedding and encoding run in a process pool.
+Requests that arrive within --batch-ms of each other go to a worker as one
+batch, which saves a pool round trip per image. Once --max-pending requests
+are queued or running, new ones get 503 with Retry-After rather than
+queueing without bound. Only the standard library is used. The HTTP/1.1
+subset supports keep-alive and Content-Length bodies, not chunked uploads.
+"""
+import asyncio
+import bisect
+import json
+import os
+import signal
+import time
+from concurrent.futures import ProcessPoolExecutor
+from urllib.parse import parse_qs, urlsplit
+
+from PIL import Image
+
+from .bitplane import check_watermark_bytes
+from .cache import DEFAULT_CACHE_BYTES, WatermarkCache
+from .core import embed_lsb_bytes, extract_lsb_bytes
+
+DEFAULT_PORT = 8080
+DEFAULT_MAX_PENDING = 64
+DEFAULT_MAX_BATCH = 8
+DEFAULT_BATCH_DELAY = 0.002
+DEFAULT_MAX_BODY_BYTES = 64 * 1024 * 1024
+DEFAULT_MIN_SCORE = 0.95
+
+# Histogram bucket upper bounds in milliseconds; the last bucket is open
+LATENCY_BUCKETS_MS = (1, 2, 5, 10, 20, 50, 100, 200, 500, 1000, 2000, 5000, 10000)
+
+CONTENT_TYPES = {
+    '.png': 'image/png',
+    '.tif': 'image/tiff',
+    '.tiff': 'image/tiff',
+    '.bmp': 'image/bmp',
+    '.ppm': 'image/x-portable-pixmap',
+    '.webp': 'image/webp',
+}
+
+REASONS = {200: 'OK', 400: 'Bad Request', 404: 'Not Found', 405: 'Method Not Allowed',
+           411: 'Length Required', 413: 'Payload Too Large', 500: 'Internal Server Error',
+           503: 'Service Unavailable'}
+
+OPERATIONS = ('embed', 'extract', 'verify')
+
+# Per-process state for pool workers, set by _init_worker
+worker_cache = WatermarkCache()
+worker_encoder = None
+
+
+class HttpError(Exception):
+    def __init__(self, status, message):
+        super().__init__(message)
+        self.status = status
+
+
+def _init_worker(cache_bytes, encoder):
+    global worker_encoder
+    worker_cache.max_bytes = cache_bytes
+    worker_encoder = encoder
+
+
+def run_items(items):
+    # Runs one batch in a worker. Each item is (operation, data,
+    # watermark_path, ext) and gets (status, result, size) back; errors are
+    # reported per item so one bad upload does not fail its whole batch.
+    results = []
+    for operation, data, watermark_path, ext in items:
+        try:
+            if operation == 'embed':
+                body, size = embed_lsb_bytes(data, watermark_path, ext, worker_cache,
+                                             worker_encoder)
+            elif operation == 'extract':
+                body, size = extract_lsb_bytes(data, ext, worker_encoder)
+            else:
+                body, size = check_watermark_bytes(data, watermark_path, worker_cache)
+            results.append((200, body, size))
+        except Image.UnidentifiedImageError:
+            results.append((400, "Request body is not a recognised image", None))
+        except (OSError, ValueError, Image.DecompressionBombError) as e:
+            # Undecodable or oversized uploads are the client's problem
+            results.append((400, f"{type(e).__name__}: {e}", None))
+        except Exception as e:
+            results.append((500, f"{type(e).__name__}: {e}", None))
+    return results
+
+
+class LatencyHistogram:
+
+    def __init__(self, bounds_ms=LATENCY_BUCKETS_MS):
+        self.bounds_ms = bounds_ms
+        self.counts = [0] * (len(bounds_ms) + 1)
+        self.count = 0
+        self.total_seconds = 0.0
+
+    def observe(self, seconds):
+        self.counts[bisect.bisect_left(self.bounds_ms, seconds * 1000)] += 1
+        self.count += 1
+        self.total_seconds += seconds
+
+    def quantile(self, q):
+        # Upper bound of the bucket holding the q-th observation
+        if not self.count:
+            return None
+        rank = q * self.count
+        seen = 0
+        for bound, count in zip(self.bounds_ms + (float('inf'),), self.counts):
+            seen += count
+            if seen >= rank:
+                return bound
+        return float('inf')
+
+    def snapshot(self):
+        labels = [f"le_{bound}ms" for bound in self.bounds_ms] + ['inf']
+        return {
+            'count': self.count,
+            'mean_ms': self.total_seconds * 1000 / self.count if self.count else None,
+            'p50_ms': self.quantile(0.5),
+            'p90_ms': self.quantile(0.9),
+            'p99_ms': self.quantile(0.99),
+            'buckets': dict(zip(labels, self.counts)),
+        }
+
+
+class WatermarkService:
+    # watermarks maps names to watermark image paths; the first one is the
+    # default for requests that do not name one
+
+    def __init__(self, watermarks, workers=2, max_pending=DEFAULT_MAX_PENDING,
+                 max_batch=DEFAULT_MAX_BATCH, batch_delay=DEFAULT_BATCH_DELAY,
+                 max_body_bytes=DEFAULT_MAX_BODY_BYTES, cache_bytes=DEFAULT_CACHE_BYTES,
+                 encoder=None):
+        if not watermarks:
+            raise ValueError("The service needs at least one watermark")
+        for path in watermarks.values():
+            if not os.path.isfile(path):
+                raise ValueError(f"Watermark not found: {path}")
+        self.watermarks = dict(watermarks)
+        self.default_watermark = next(iter(self.watermarks))
+        self.workers = workers
+        self.max_pending = max_pending
+        self.max_batch = max_batch
+        self.batch_delay = batch_delay
+        self.max_body_bytes = max_body_bytes
+        self.histograms = {operation: LatencyHistogram() for operation in OPERATIONS}
+        self.pending = 0
+        self.rejected = 0
+        self.errors = 0
+        self.batches = 0
+        self.batched_items = 0
+        self._pool = ProcessPoolExecutor(max_workers=workers, initializer=_init_worker,
+                                         initargs=(cache_bytes, encoder))
+        self._queue = None
+        self._batchers = []
+        self._servers = []
+
+    async def start(self, host='127.0.0.1', port=DEFAULT_PORT, unix_path=None):
+        # Listens on a Unix socket when unix_path is given, TCP otherwise
+        self._queue = asyncio.Queue()
+        # One batcher per worker keeps every worker busy with one batch
+        self._batchers = [asyncio.ensure_future(self._batch_loop())
+                          for _ in range(self.workers)]
+        if unix_path:
+            server = await asyncio.start_unix_server(self._handle_connection, unix_path)
+        else:
+            server = await asyncio.start_server(self._handle_connection, host, port)
+        self._servers.append(server)
+        return server
+
+    async def close(self):
+        for server in self._servers:
+            server.close()
+            await server.wait_closed()
+        for task in self._batchers:
+            task.cancel()
+        await asyncio.gather(*self._batchers, return_exceptions=True)
+        self._pool.shutdown(wait=True, cancel_futures=True)
+
+    async def submit(self, operation, data, watermark_path=None, ext='.png'):
+        # Queues one item and waits for its (status, result, size)
+        if self.pending >= self.max_pending:
+            self.rejected += 1
+            raise HttpError(503, f"Too many pending requests ({self.max_pending})")
+        self.pending += 1
+        try:
+            future = asyncio.get_running_loop().create_future()
+            await self._queue.put(((operation, data, watermark_path, ext), future))
+            return await future
+        finally:
+            self.pending -= 1
+
+    async def _batch_loop(self):
+        loop = asyncio.get_running_loop()
+        while True:
+            batch = [await self._queue.get()]
+            deadline = loop.time() + self.batch_delay
+            while len(batch) < self.max_batch:
+                if not self._queue.empty():
+                    batch.append(self._queue.get_nowait())
+                    continue
+                timeout = deadline - loop.time()
+                if timeout <= 0:
+                    break
+                try:
+                    batch.append(await asyncio.wait_for(self._queue.get(), timeout))
+                except asyncio.TimeoutError:
+                    break
+            # Clients that disconnected while queued are dropped here
+            batch = [(item, future) for item, future in batch if not future.done()]
+            if not batch:
+                continue
+            self.batches += 1
+            self.batched_items += len(batch)
+            try:
+                results = await loop.run_in_executor(self._pool, run_items,
+                                                     [item for item, _ in batch])
+            except Exception as e:
+                results = [(500, f"{type(e).__name__}: {e}", None)] * len(batch)
+            for (_, future), result in zip(batch, results):
+                if not future.done():
+                    future.set_result(result)
+
+    def metrics(self):
+        return {
+            'latency': {name: h.snapshot() for name, h in self.histograms.items()},
+            'pending': self.pending,
+            'queued': self._queue.qsize() if self._queue is not None else 0,
+            'max_pending': self.max_pending,
+            'rejected': self.rejected,
+            'errors': self.errors,
+            'batches': self.batches,
+            'mean_batch_size': self.batched_items / self.batches if self.batches else 0.0,
+            'workers': self.workers,
+            'watermarks': sorted(self.watermarks),
+        }
+
+    # HTTP --------------------------------------------------------------------
+
+    async def _handle_connection(self, reader, writer):
+        try:
+            while True:
+                keep_alive = await self._handle_request(reader, writer)
+                if not keep_alive:
+                    break
+        except (ConnectionError, asyncio.IncompleteReadError, ValueError):
+            # ValueError: a request or header line over the stream's limit
+            pass
+        finally:
+            writer.close()
+
+    async def _handle_request(self, reader, writer):
+        # Returns whether the connection stays open for another request
+        request_line = await reader.readline()
+        if not request_line.strip():
+            return False
+        try:
+            method, target, version = request_line.decode('latin-1').split()
+        except ValueError:
+            await self._respond(writer, 400, 'Malformed request line', close=True)
+            return False
+        headers = await _read_headers(reader)
+        keep_alive = version == 'HTTP/1.1' and headers.get('connection', '').lower() != 'close'
+
+        start = time.perf_counter()
+        url = urlsplit(target)
+        params = {key: values[-1] for key, values in parse_qs(url.query).items()}
+        operation = url.path.strip('/')
+        try:
+            if method == 'GET' and operation == 'health':
+                status, body, content_type, extra = 200, b'ok\n', 'text/plain', {}
+            elif method == 'GET' and operation == 'metrics':
+                status, body, content_type, extra = 200, _json(self.metrics()), \
+                    'application/json', {}
+            elif operation not in OPERATIONS:
+                raise HttpError(404, f"Unknown route {url.path}")
+            elif method != 'POST':
+                raise HttpError(405, f"{url.path} needs POST")
+            else:
+                data = await self._read_body(reader, writer, headers)
+                status, body, content_type, extra = await self._run(operation, data, params)
+        except HttpError as e:
+            if e.status in (411, 413):
+                # The body was not read, so the connection cannot be reused
+                keep_alive = False
+            status, body, content_type, extra = e.status, _json({'error': str(e)}), \
+                'application/json', {'Retry-After': '1'} if e.status == 503 else {}
+        if operation in self.histograms:
+            self.histograms[operation].observe(time.perf_counter() - start)
+            if status >= 400:
+                self.errors += 1
+        await self._respond(writer, status, body, content_type, extra, close=not keep_alive)
+        return keep_alive
+
+    async def _read_body(self, reader, writer, headers):
+        if 'chunked' in headers.get('transfer-encoding', '').lower():
+            raise HttpError(411, "Chunked uploads are not supported; send Content-Length")
+        try:
+            length = int(headers.get('content-length', ''))
+        except ValueError:
+            raise HttpError(411, "Content-Length required")
+        if length > self.max_body_bytes:
+            raise HttpError(413, f"Body larger than {self.max_body_bytes} bytes")
+        if headers.get('expect', '').lower() == '100-continue':
+            # curl asks before sending large uploads
+            writer.write(b'HTTP/1.1 100 Continue\r\n\r\n')
+        return await reader.readexactly(length)
+
+    async def _run(self, operation, data, params):
+        if not data:
+            raise HttpError(400, "Empty request body")
+        ext = '.' + params.get('format', 'png').lower().lstrip('.')
+        if operation != 'verify' and ext not in CONTENT_TYPES:
+            raise HttpError(400, f"Unsupported format {ext}; use one of "
+                                 f"{', '.join(sorted(CONTENT_TYPES))}")
+        watermark_path = None
+        if operation != 'extract':
+            name = params.get('watermark', self.default_watermark)
+            watermark_path = self.watermarks.get(name)
+            if watermark_path is None:
+                raise HttpError(400, f"Unknown watermark '{name}'")
+        status, result, size = await self.submit(operation, data, watermark_path, ext)
+        if status != 200:
+            raise HttpError(status, result)
+        width, height = size
+        extra = {'X-Image-Width': str(width), 'X-Image-Height': str(height)}
+        if operation == 'verify':
+            try:
+                min_score = float(params.get('min_score', DEFAULT_MIN_SCORE))
+            except ValueError:
+                raise HttpError(400, "min_score must be a number")
+            body = _json({'score': result, 'match': result >= min_score,
+                          'width': width, 'height': height})
+            return 200, body, 'application/json', extra
+        return 200, result, CONTENT_TYPES[ext], extra
+
+    async def _respond(self, writer, status, body, content_type='text/plain', extra=None,
+                       close=False):
+        if isinstance(body, str):
+            body = body.encode()
+        lines = [f"HTTP/1.1 {status} {REASONS.get(status, '')}",
+                 f"Content-Type: {content_type}",
+                 f"Content-Length: {len(body)}"]
+        lines += [f"{key}: {value}" for key, value in (extra or {}).items()]
+        if close:
+            lines.append('Connection: close')
+        writer.write(('\r\n'.join(lines) + '\r\n\r\n').encode('latin-1') + body)
+        await writer.drain()
+
+
+async def _read_headers(reader):
+    headers = {}
+    while True:
+        line = await reader.readline()
+        if line in (b'\r\n', b'\n', b''):
+            return headers
+        name, _, value = line.decode('latin-1').partition(':')
+        headers[name.strip().lower()] = value.strip()
+
+
+def _json(value):
+    return (json.dumps(value) + '\n').encode()
+
+
+async def serve(service, host='127.0.0.1', port=DEFAULT_PORT, unix_path=None, ready=None):
+    # Runs until cancelled or sent SIGINT/SIGTERM; ready is called with the
+    # listening address
+    stop = asyncio.Event()
+    loop = asyncio.get_running_loop()
+    for signum in (signal.SIGINT, signal.SIGTERM):
+        try:
+            loop.add_signal_handler(signum, stop.set)
+        except (NotImplementedError, RuntimeError):
+            # Windows, or not running in the main thread
+            pass
+    try:
+        server = await service.start(host, port, unix_path)
+    except OSError:
+        await service.close()
+        raise
+    if ready is not None:
+        ready(unix_path or server.sockets[0].getsockname()[:2])
+    try:
+        await stop.wait()
+    finally:
+        await service.close()
+        if unix_path and os.path.exists(unix_path):
+            os.remove(unix_path)
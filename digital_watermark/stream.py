@@ -0,0 +1,233 @@
+"""Strip-by-strip LSB embed/extract for hosts too large to hold in memory.
+
+The host is read a strip of rows at a time and the matching watermark
+bits for each strip are sampled on the fly from the watermark at its own
+resolution, so peak memory is proportional to the strip, not the image.
+Uncompressed inputs (.npy, BMP, PPM, uncompressed TIFF) are read
+straight from the file; other formats are decoded once by PIL and then
+processed in strips. Output is written incrementally as PNG, PPM or NPY.
+"""
+import os
+import struct
+import zlib
+
+import numpy as np
+
+from .core import DEFAULT_THRESHOLD, _report, extract_lsb_array, make_placement
+from .encode import DEFAULT_ENCODE_OPTIONS
+from .rawio import open_unbounded, raw_layout
+
+# Target bytes of host pixels held per strip
+DEFAULT_STRIP_BYTES = 16 * 1024 * 1024
+
+STREAM_OUTPUT_EXTENSIONS = ('.png', '.ppm', '.npy')
+
+
+class NpyStripReader:
+
+    def __init__(self, path):
+        self._pixels = np.load(path, mmap_mode='r')
+        if self._pixels.ndim != 3 or self._pixels.shape[2] < 3 or self._pixels.dtype != np.uint8:
+            raise ValueError(f"{path}: expected an (height, width, 3) uint8 array")
+        self.height, self.width = self._pixels.shape[:2]
+
+    def read(self, top, rows):
+        return np.array(self._pixels[top:top + rows, :, :3])
+
+    def close(self):
+        self._pixels = None
+
+
+class RawStripReader:
+    # Reads rows of an uncompressed BMP/PPM/TIFF with plain file reads
+
+    def __init__(self, path, layout):
+        self._file = open(path, 'rb')
+        self._layout = layout
+        self.width = layout.width
+        self.height = layout.height
+
+    def read(self, top, rows):
+        layout = self._layout
+        strip = np.empty((rows, self.width, 3), dtype=np.uint8)
+        y = top
+        while y < top + rows:
+            segment = layout.segment_for(y)
+            end = min(top + rows, segment.bottom)
+            count = end - y
+            # Rows of one segment are contiguous in the file in either order
+            first = segment.row_offset(end - 1 if segment.bottom_up else y)
+            self._file.seek(first)
+            data = self._file.read(count * segment.stride)
+            block = np.frombuffer(data, dtype=np.uint8).reshape(count, segment.stride)
+            block = block[:, :self.width * layout.bytes_per_pixel]
+            block = block.reshape(count, self.width, layout.bytes_per_pixel)
+            if segment.bottom_up:
+                block = block[::-1]
+            strip[y - top:end - top] = block[:, :, list(layout.rgb_order)]
+            y = end
+        return strip
+
+    def close(self):
+        self._file.close()
+
+
+class DecodedStripReader:
+    # Fallback for compressed formats: PIL decodes the image once and the
+    # strips are converted to RGB one at a time
+
+    def __init__(self, path):
+        with open_unbounded(path) as img:
+            img.load()
+            self._img = img
+        self.width, self.height = self._img.size
+
+    def read(self, top, rows):
+        box = (0, top, self.width, top + rows)
+        return np.array(self._img.crop(box).convert('RGB'))
+
+    def close(self):
+        self._img.close()
+
+
+def open_strip_reader(path):
+    if path.lower().endswith('.npy'):
+        return NpyStripReader(path)
+    layout = raw_layout(path)
+    if layout is not None:
+        return RawStripReader(path, layout)
+    return DecodedStripReader(path)
+
+
+class PngStripWriter:
+    # Minimal streaming PNG encoder (8-bit RGB or grayscale, no filtering)
+
+    def __init__(self, path, width, height, channels=3, compress_level=6):
+        self.width = width
+        self.channels = channels
+        self._file = open(path, 'wb')
+        self._compressor = zlib.compressobj(compress_level)
+        color_type = 2 if channels == 3 else 0
+        self._file.write(b'\x89PNG\r\n\x1a\n')
+        self._chunk(b'IHDR', struct.pack('>IIBBBBB', width, height, 8, color_type, 0, 0, 0))
+
+    def write(self, rows):
+        rows = rows.reshape(rows.shape[0], -1)
+        # Each scanline starts with filter type 0 (None)
+        scanlines = np.zeros((rows.shape[0], rows.shape[1] + 1), dtype=np.uint8)
+        scanlines[:, 1:] = rows
+        data = self._compressor.compress(scanlines.tobytes())
+        if data:
+            self._chunk(b'IDAT', data)
+
+    def close(self):
+        self._chunk(b'IDAT', self._compressor.flush())
+        self._chunk(b'IEND', b'')
+        self._file.close()
+
+    def _chunk(self, kind, data):
+        self._file.write(struct.pack('>I', len(data)))
+        self._file.write(kind)
+        self._file.write(data)
+        self._file.write(struct.pack('>I', zlib.crc32(data, zlib.crc32(kind)) & 0xFFFFFFFF))
+
+
+class PpmStripWriter:
+
+    def __init__(self, path, width, height, channels=3):
+        self._file = open(path, 'wb')
+        magic = b'P6' if channels == 3 else b'P5'
+        self._file.write(magic + f"\n{width} {height}\n255\n".encode('ascii'))
+
+    def write(self, rows):
+        self._file.write(np.ascontiguousarray(rows).tobytes())
+
+    def close(self):
+        self._file.close()
+
+
+class NpyStripWriter:
+
+    def __init__(self, path, width, height, channels=3):
+        shape = (height, width, channels) if channels > 1 else (height, width)
+        self._pixels = np.lib.format.open_memmap(path, mode='w+', dtype=np.uint8, shape=shape)
+        self._row = 0
+
+    def write(self, rows):
+        self._pixels[self._row:self._row + rows.shape[0]] = rows
+        self._row += rows.shape[0]
+        # Push finished rows to disk so they do not accumulate in memory
+        self._pixels.flush()
+
+    def close(self):
+        self._pixels.flush()
+        self._pixels = None
+
+
+def open_strip_writer(path, width, height, channels=3, encoder=None):
+    # Only the PNG compress level of encoder applies to streamed output
+    ext = os.path.splitext(path)[1].lower()
+    if ext == '.png':
+        encoder = encoder or DEFAULT_ENCODE_OPTIONS
+        return PngStripWriter(path, width, height, channels, encoder.compress_level)
+    if ext == '.ppm':
+        return PpmStripWriter(path, width, height, channels)
+    if ext == '.npy':
+        return NpyStripWriter(path, width, height, channels)
+    raise ValueError(f"Streaming output must be one of {', '.join(STREAM_OUTPUT_EXTENSIONS)}")
+
+
+def _strip_rows(width, strip_rows):
+    if strip_rows:
+        return strip_rows
+    return max(1, DEFAULT_STRIP_BYTES // (width * 3))
+
+
+def embed_lsb_streaming(host_path, watermark_path, output_path, strip_rows=None,
+                        threshold=DEFAULT_THRESHOLD, progress=None, encoder=None,
+                        placement='nearest'):
+    # Unlike embed_lsb the watermark defaults to nearest-neighbour scaling;
+    # 'stretch' is refused, since a smooth resize needs the whole
+    # full-resolution watermark at once
+    if placement == 'stretch':
+        raise ValueError("Streaming cannot stretch the watermark; use another placement")
+    _report(progress, 'load')
+    reader = open_strip_reader(host_path)
+    try:
+        width, height = reader.width, reader.height
+        _report(progress, 'resize')
+        placed = make_placement(watermark_path, width, height, placement, threshold=threshold)
+        writer = open_strip_writer(output_path, width, height, encoder=encoder)
+        _report(progress, 'embed')
+        rows = _strip_rows(width, strip_rows)
+        try:
+            for top in range(0, height, rows):
+                count = min(rows, height - top)
+                strip = reader.read(top, count)
+                placed.embed_rows(strip[..., 0], top)
+                writer.write(strip)
+        finally:
+            writer.close()
+    finally:
+        reader.close()
+    return width, height
+
+
+def extract_lsb_streaming(watermarked_path, output_path, strip_rows=None, progress=None,
+                          encoder=None):
+    _report(progress, 'load')
+    reader = open_strip_reader(watermarked_path)
+    try:
+        width, height = reader.width, reader.height
+        writer = open_strip_writer(output_path, width, height, channels=1, encoder=encoder)
+        _report(progress, 'extract')
+        rows = _strip_rows(width, strip_rows)
+        try:
+            for top in range(0, height, rows):
+                strip = reader.read(top, min(rows, height - top))
+                writer.write(extract_lsb_array(strip))
+        finally:
+            writer.close()
+    finally:
+        reader.close()
+    return width, height
@@ -0,0 +1,221 @@
+"""Watermark every frame of a video or image sequence as a stream.
+
+Frames flow through generators: read -> watermark -> write. The
+watermark placement is prepared once per frame size (via WatermarkCache)
+and written into each frame in place. Decoding and embedding each run in
+their own background thread behind bounded queues, so decode, embed and
+encode overlap while memory stays at a few frames.
+
+Video files need OpenCV (cv2). LSB marks only survive lossless output,
+so videos are written with the FFV1 codec (.mkv or .avi).
+"""
+import glob
+import os
+import queue
+import threading
+import time
+from dataclasses import dataclass
+
+import numpy as np
+
+from .cache import WatermarkCache
+from .core import load_host, make_placement
+from .defaults import DEFAULT_PLACEMENT, DEFAULT_QUEUE_SIZE
+from .encode import check_lossless, save_image
+
+VIDEO_EXTENSIONS = ('.mkv', '.avi', '.mp4', '.mov')
+FRAME_EXTENSIONS = ('.png', '.jpg', '.jpeg', '.bmp', '.tif', '.tiff', '.ppm', '.npy')
+LOSSLESS_VIDEO_EXTENSIONS = ('.mkv', '.avi')
+
+
+@dataclass
+class Frame:
+    index: int
+    # (height, width, 3) uint8 in RGB channel order (possibly a view)
+    pixels: object
+    name: str = None
+
+
+def _cv2():
+    try:
+        import cv2
+    except ImportError:
+        raise RuntimeError("Video files need OpenCV: pip install opencv-python") from None
+    return cv2
+
+
+def is_video(path):
+    return os.path.isfile(path) and path.lower().endswith(VIDEO_EXTENSIONS)
+
+
+def read_frames(source):
+    # A video file, a directory of images or a glob pattern
+    if is_video(source):
+        return read_video(source)
+    if os.path.isdir(source):
+        paths = [os.path.join(source, name) for name in os.listdir(source)]
+    else:
+        paths = glob.glob(source)
+    paths = sorted(path for path in paths if path.lower().endswith(FRAME_EXTENSIONS))
+    return read_image_sequence(paths)
+
+
+def read_image_sequence(paths):
+    for index, path in enumerate(paths):
+        if path.lower().endswith('.npy'):
+            pixels = np.load(path)
+        else:
+            pixels = load_host(path)
+        yield Frame(index, pixels, os.path.basename(path))
+
+
+def read_video(path):
+    cv2 = _cv2()
+    capture = cv2.VideoCapture(path)
+    if not capture.isOpened():
+        raise ValueError(f"Cannot open video {path}")
+    try:
+        index = 0
+        while True:
+            ok, frame = capture.read()
+            if not ok:
+                break
+            # OpenCV decodes BGR; a reversed view puts red first without a copy
+            yield Frame(index, frame[..., ::-1])
+            index += 1
+    finally:
+        capture.release()
+
+
+def video_fps(path, default=25.0):
+    cv2 = _cv2()
+    capture = cv2.VideoCapture(path)
+    try:
+        return capture.get(cv2.CAP_PROP_FPS) or default
+    finally:
+        capture.release()
+
+
+def watermark_frames(frames, watermark_path, cache=None, placement=DEFAULT_PLACEMENT):
+    # Embeds in place and yields each frame; one placement per frame size
+    cache = cache if cache is not None else WatermarkCache()
+    placements = {}
+    for frame in frames:
+        height, width = frame.pixels.shape[:2]
+        placed = placements.get((width, height))
+        if placed is None:
+            placed = make_placement(watermark_path, width, height, placement, cache)
+            placements[(width, height)] = placed
+        # Frames from read_video are reversed BGR views; channel 0 is still red
+        placed.embed_rows(frame.pixels[..., 0])
+        yield frame
+
+
+def prefetch(iterable, maxsize=DEFAULT_QUEUE_SIZE):
+    # Runs iterable in a background thread, handing items over through a
+    # bounded queue; exceptions are re-raised in the consumer
+    items = queue.Queue(maxsize)
+    done = object()
+    stop = threading.Event()
+
+    def produce():
+        try:
+            for item in iterable:
+                while not stop.is_set():
+                    try:
+                        items.put((item, None), timeout=0.1)
+                        break
+                    except queue.Full:
+                        continue
+                if stop.is_set():
+                    return
+            items.put((done, None))
+        except BaseException as e:
+            items.put((done, e))
+
+    thread = threading.Thread(target=produce, daemon=True)
+    thread.start()
+    try:
+        while True:
+            item, error = items.get()
+            if item is done:
+                if error is not None:
+                    raise error
+                return
+            yield item
+    finally:
+        stop.set()
+
+
+def write_image_sequence(frames, output_dir, ext='.png', encoder=None):
+    os.makedirs(output_dir, exist_ok=True)
+    count = 0
+    for frame in frames:
+        stem = os.path.splitext(frame.name)[0] if frame.name else f"frame_{frame.index:06d}"
+        save_image(frame.pixels, os.path.join(output_dir, stem + ext), encoder)
+        count += 1
+    return count
+
+
+def write_video(frames, path, fps):
+    if not path.lower().endswith(LOSSLESS_VIDEO_EXTENSIONS):
+        raise ValueError("LSB watermarks need lossless video; write to .mkv or .avi (FFV1)")
+    cv2 = _cv2()
+    writer = None
+    count = 0
+    try:
+        for frame in frames:
+            if writer is None:
+                size = frame.pixels.shape[:2]
+                height, width = size
+                writer = cv2.VideoWriter(path, cv2.VideoWriter_fourcc(*'FFV1'), fps,
+                                         (width, height))
+                if not writer.isOpened():
+                    raise RuntimeError(f"OpenCV cannot write FFV1 video to {path}")
+            elif frame.pixels.shape[:2] != size:
+                # VideoWriter silently drops such frames, and resizing would
+                # destroy their watermark
+                name = frame.name or f"frame {frame.index}"
+                raise ValueError(f"{name} is {frame.pixels.shape[1]}x{frame.pixels.shape[0]}, "
+                                 f"but the video is {width}x{height}; all frames must "
+                                 "be the same size")
+            # Back to BGR; for frames read by read_video this is the original buffer
+            writer.write(frame.pixels[..., ::-1])
+            count += 1
+    except BaseException:
+        if writer is not None:
+            writer.release()
+            writer = None
+            # Not a partial video that looks complete
+            try:
+                os.remove(path)
+            except OSError:
+                pass
+        raise
+    finally:
+        if writer is not None:
+            writer.release()
+    return count
+
+
+def run_video_pipeline(source, output, watermark_path, queue_size=DEFAULT_QUEUE_SIZE,
+                       cache=None, frame_ext='.png', encoder=None, placement=DEFAULT_PLACEMENT):
+    # Returns a summary dict with the frame count and frames per second.
+    # frame_ext and encoder apply when writing an image sequence.
+    to_video = output.lower().endswith(VIDEO_EXTENSIONS)
+    if not to_video:
+        check_lossless(frame_ext)
+    start = time.perf_counter()
+    frames = prefetch(read_frames(source), queue_size)
+    marked = prefetch(watermark_frames(frames, watermark_path, cache, placement), queue_size)
+    if to_video:
+        fps = video_fps(source) if is_video(source) else 25.0
+        count = write_video(marked, output, fps)
+    else:
+        count = write_image_sequence(marked, output, frame_ext, encoder)
+    seconds = time.perf_counter() - start
+    return {
+        'frames': count,
+        'seconds': seconds,
+        'frames_per_second': count / seconds if seconds else 0.0,
+    }
@@ -1,12 +1,95 @@
 import sys
 import os
+import threading
 from PyQt5.QtWidgets import (QApplication, QWidget, QLabel, QPushButton, 
                             QVBoxLayout, QHBoxLayout, QFileDialog, QTextEdit,
-                            QGroupBox, QRadioButton, QDoubleSpinBox)
+                            QGroupBox, QRadioButton, QSpinBox, QDoubleSpinBox)
 from PyQt5.QtGui import QPixmap
-from PyQt5.QtCore import Qt
-from PIL import Image
-import numpy as np
+from PyQt5.QtCore import Qt, QObject, QRunnable, QThreadPool, pyqtSignal
+from digital_watermark import dct
+from digital_watermark.cache import WatermarkCache
+from digital_watermark.encode import DEFAULT_ENCODE_OPTIONS, EncodeOptions, is_lossless
+from digital_watermark.methods import available_methods, format_stages
+from digital_watermark.preview import PreviewCache
+
+# LSB bits only survive lossless formats, so JPEG is not offered
+SAVE_FILTER = ('PNG Image (*.png);;TIFF Image (*.tif *.tiff);;BMP Image (*.bmp);;'
+               'WebP Lossless (*.webp)')
+
+# Status log text for the stages reported by the core functions
+STAGE_MESSAGES = {
+    'start': 'started',
+    'load': 'loading image',
+    'convert': 'converting pixels',
+    'resize': 'preparing watermark',
+    'embed': 'embedding',
+    'extract': 'extracting',
+    'encode': 'saving',
+}
+
+class JobCancelled(Exception):
+    pass
+
+class JobSignals(QObject):
+    progress = pyqtSignal(int, str)
+    finished = pyqtSignal(int, object)
+    failed = pyqtSignal(int, str)
+    cancelled = pyqtSignal(int)
+
+class WatermarkJob(QRunnable):
+    # Runs one embed/extract call on a pool thread. Progress is reported back
+    # to the GUI thread through signals; cancellation takes effect at the
+    # next stage boundary, so no half-written output is left behind.
+
+    def __init__(self, job_id, func, *args):
+        super().__init__()
+        self.setAutoDelete(False)
+        self.job_id = job_id
+        self.func = func
+        self.args = args
+        self.signals = JobSignals()
+        self._cancelled = threading.Event()
+        
+    def cancel(self):
+        self._cancelled.set()
+        
+    def check(self, stage):
+        if self._cancelled.is_set():
+            raise JobCancelled()
+        self.signals.progress.emit(self.job_id, stage)
+        
+    def run(self):
+        try:
+            self.check('start')
+            result = self.func(*self.args, progress=self.check)
+        except JobCancelled:
+            self.signals.cancelled.emit(self.job_id)
+        except Exception as e:
+            self.signals.failed.emit(self.job_id, str(e))
+        else:
+            self.signals.finished.emit(self.job_id, result)
+
+class PreviewSignals(QObject):
+    ready = pyqtSignal(str, bytes)
+    failed = pyqtSignal(str)
+
+class PreviewJob(QRunnable):
+    # Produces a reduced-size preview off the GUI thread
+
+    def __init__(self, cache, image_path):
+        super().__init__()
+        self.setAutoDelete(False)
+        self.cache = cache
+        self.image_path = image_path
+        self.signals = PreviewSignals()
+        
+    def run(self):
+        try:
+            data = self.cache.get(self.image_path)
+        except Exception:
+            self.signals.failed.emit(self.image_path)
+        else:
+            self.signals.ready.emit(self.image_path, data)
 
 class WatermarkingApp(QWidget):
 
@@ -19,6 +102,20 @@ class WatermarkingApp(QWidget):
         self.host_path = ''
         self.watermark_path = ''
         self.method = 'LSB'  # Default method
+        self.watermark_cache = WatermarkCache()
+        
+        # Background jobs; a small pool keeps several large images from
+        # being held in memory at once while later jobs wait in the queue
+        self.pool = QThreadPool()
+        self.pool.setMaxThreadCount(2)
+        self.jobs = {}
+        self.next_job_id = 1
+        
+        # Previews get their own pool so they never wait behind a long embed
+        self.preview_cache = PreviewCache()
+        self.preview_pool = QThreadPool()
+        self.preview_jobs = set()
+        self.preview_paths = {}
         
         # Create UI
         self.init_ui()
@@ -33,14 +130,30 @@ class WatermarkingApp(QWidget):
         # Method selection
         method_group = QGroupBox("Watermarking Method")
         method_layout = QVBoxLayout()
-        self.lsb_radio = QRadioButton("LSB (Simple)")
-        self.lsb_radio.setChecked(True)
-        method_layout.addWidget(self.lsb_radio)
+        # One button per registered method; the first is the default
+        self.method_radios = []
+        for method in available_methods():
+            radio = QRadioButton(method.label)
+            method_layout.addWidget(radio)
+            self.method_radios.append((radio, method))
+        self.method_radios[0][0].setChecked(True)
         method_group.setLayout(method_layout)
         
-        # Parameters (remove DCT parameters)
+        # Parameters
         param_group = QGroupBox("Parameters")
         param_layout = QVBoxLayout()
+        self.alpha_spin = QDoubleSpinBox()
+        self.alpha_spin.setRange(0.01, 0.2)
+        self.alpha_spin.setSingleStep(0.01)
+        self.alpha_spin.setValue(dct.DEFAULT_ALPHA)
+        self.alpha_spin.setPrefix("DCT Strength: ")
+        param_layout.addWidget(self.alpha_spin)
+        # Lower levels save large images much faster at the cost of disk space
+        self.compress_spin = QSpinBox()
+        self.compress_spin.setRange(0, 9)
+        self.compress_spin.setValue(DEFAULT_ENCODE_OPTIONS.compress_level)
+        self.compress_spin.setPrefix("PNG Compression: ")
+        param_layout.addWidget(self.compress_spin)
         param_group.setLayout(param_layout)
         
         # Image selection buttons
@@ -59,6 +172,10 @@ class WatermarkingApp(QWidget):
         self.extract_button.clicked.connect(self.extract)
         self.extract_button.setStyleSheet("background-color: #2196F3; color: white;")
         
+        self.cancel_button = QPushButton('Cancel Jobs')
+        self.cancel_button.clicked.connect(self.cancel_jobs)
+        self.cancel_button.setEnabled(False)
+        
         # Status log
         self.status = QTextEdit()
         self.status.setReadOnly(True)
@@ -70,6 +187,7 @@ class WatermarkingApp(QWidget):
         control_layout.addWidget(self.watermark_button)
         control_layout.addWidget(self.embed_button)
         control_layout.addWidget(self.extract_button)
+        control_layout.addWidget(self.cancel_button)
         control_layout.addWidget(self.status)
         control_panel.setLayout(control_layout)
         
@@ -100,22 +218,37 @@ class WatermarkingApp(QWidget):
         self.status.append(f"> {message}")
         
     def update_image_preview(self, label, image_path):
+        self.preview_paths[label] = image_path
         if image_path:
-            pixmap = QPixmap(image_path)
-            if not pixmap.isNull():
-                # Scale pixmap but maintain aspect ratio
-                pixmap = pixmap.scaled(300, 300, Qt.KeepAspectRatio)
-                label.setPixmap(pixmap)
-                self.log(f"Loaded: {os.path.basename(image_path)}")
-            else:
-                label.setText("Invalid image format")
+            label.setText("Loading preview...")
+            job = PreviewJob(self.preview_cache, image_path)
+            job.signals.ready.connect(
+                lambda path, data, job=job: self.show_preview(job, label, path, data))
+            job.signals.failed.connect(
+                lambda path, job=job: self.show_preview(job, label, path, None))
+            self.preview_jobs.add(job)
+            self.preview_pool.start(job)
         else:
             label.clear()
             
+    def show_preview(self, job, label, image_path, data):
+        self.preview_jobs.discard(job)
+        # Ignore previews for an image that has since been replaced
+        if self.preview_paths.get(label) != image_path:
+            return
+        pixmap = QPixmap()
+        if data is not None and pixmap.loadFromData(data):
+            # Previews already fit 300x300; this only guards the aspect ratio
+            pixmap = pixmap.scaled(300, 300, Qt.KeepAspectRatio)
+            label.setPixmap(pixmap)
+            self.log(f"Loaded: {os.path.basename(image_path)}")
+        else:
+            label.setText("Invalid image format")
+            
     def select_host_image(self):
         file_name, _ = QFileDialog.getOpenFileName(
             self, 'Select Host Image', '', 
-            'Images (*.png *.jpg *.jpeg *.bmp)')
+            'Images (*.png *.jpg *.jpeg *.bmp *.tif *.tiff *.webp)')
         if file_name:
             self.host_path = file_name
             self.update_image_preview(self.host_label, file_name)
@@ -123,7 +256,7 @@ class WatermarkingApp(QWidget):
     def select_watermark_image(self):
         file_name, _ = QFileDialog.getOpenFileName(
             self, 'Select Watermark Image', '', 
-            'Images (*.png *.jpg *.jpeg *.bmp)')
+            'Images (*.png *.jpg *.jpeg *.bmp *.tif *.tiff *.webp)')
         if file_name:
             self.watermark_path = file_name
             self.update_image_preview(self.watermark_label, file_name)
@@ -134,65 +267,116 @@ class WatermarkingApp(QWidget):
             return
             
         output_path, _ = QFileDialog.getSaveFileName(
-            self, 'Save Watermarked Image', '', 
-            'PNG Image (*.png);;JPEG Image (*.jpg *.jpeg)')
+            self, 'Save Watermarked Image', '', SAVE_FILTER)
             
         if output_path:
-            try:
-                if self.lsb_radio.isChecked():
-                    self.embed_lsb(self.host_path, self.watermark_path, output_path)
-                self.log(f"Success! Watermarked image saved to:\n{output_path}")
-            except Exception as e:
-                self.log(f"Error during embedding: {str(e)}")
+            method = self.selected_method()
+            if method.lossless_only and not is_lossless(output_path):
+                self.log(f"Error: {method.name.upper()} watermarks need a lossless format; "
+                         "save as PNG, TIFF, BMP or WebP")
+                return
+            # Settings are read now, so a queued job keeps them even if the
+            # spin boxes change before it starts
+            self.start_job(
+                f"{method.name.upper()} embed {os.path.basename(self.host_path)}",
+                f"Success! Watermarked image saved to:\n{output_path}",
+                self.run_embed, method, self.host_path, self.watermark_path, output_path,
+                self.alpha_spin.value(), self.encode_options())
     
     def extract(self):
         file_name, _ = QFileDialog.getOpenFileName(
             self, 'Select Watermarked Image', '', 
-            'Images (*.png *.jpg *.jpeg *.bmp)')
+            'Images (*.png *.jpg *.jpeg *.bmp *.tif *.tiff *.webp)')
             
         if file_name:
             output_path, _ = QFileDialog.getSaveFileName(
-                self, 'Save Extracted Watermark', '', 
-                'PNG Image (*.png)')
+                self, 'Save Extracted Watermark', '', SAVE_FILTER)
                 
             if output_path:
-                try:
-                    if self.lsb_radio.isChecked():
-                        self.extract_lsb(file_name, output_path)
-                    self.log(f"Success! Extracted watermark saved to:\n{output_path}")
-                except Exception as e:
-                    self.log(f"Error during extraction: {str(e)}")
+                method = self.selected_method()
+                original_path = None
+                if method.needs_original:
+                    name = method.name.upper()
+                    original_path, _ = QFileDialog.getOpenFileName(
+                        self, f'Select Original Host Image (for {name} extraction)', '',
+                        'Images (*.png *.jpg *.jpeg *.bmp *.tif *.tiff *.webp)')
+                    if not original_path:
+                        self.log(f"{name} extraction requires original host image")
+                        return
+                self.start_job(
+                    f"{method.name.upper()} extract {os.path.basename(file_name)}",
+                    f"Success! Extracted watermark saved to:\n{output_path}",
+                    self.run_extract, method, file_name, output_path, original_path,
+                    self.encode_options())
+    
+    def selected_method(self):
+        for radio, method in self.method_radios:
+            if radio.isChecked():
+                return method
+        return self.method_radios[0][1]
+    
+    def encode_options(self):
+        return EncodeOptions(compress_level=self.compress_spin.value())
+    
+    # Background jobs
+    def start_job(self, description, success_message, func, *args):
+        job_id = self.next_job_id
+        self.next_job_id += 1
+        job = WatermarkJob(job_id, func, *args)
+        job.signals.progress.connect(self.on_job_progress)
+        job.signals.finished.connect(self.on_job_finished)
+        job.signals.failed.connect(self.on_job_failed)
+        job.signals.cancelled.connect(self.on_job_cancelled)
+        self.jobs[job_id] = (job, success_message)
+        self.log(f"Job {job_id} queued: {description}")
+        self.pool.start(job)
+        self.cancel_button.setEnabled(True)
+        
+    def cancel_jobs(self):
+        for job, _ in self.jobs.values():
+            job.cancel()
+        self.log(f"Cancelling {len(self.jobs)} job(s)...")
+        
+    def on_job_progress(self, job_id, stage):
+        self.log(f"Job {job_id}: {STAGE_MESSAGES.get(stage, stage)}")
+        
+    def on_job_finished(self, job_id, result):
+        _, success_message = self.finish_job(job_id)
+        self.log(success_message)
+        if result is not None:
+            _, stages = result
+            self.log(f"Job {job_id} timings: {format_stages(stages)}")
+        
+    def on_job_failed(self, job_id, message):
+        self.finish_job(job_id)
+        self.log(f"Job {job_id} failed: {message}")
+        
+    def on_job_cancelled(self, job_id):
+        self.finish_job(job_id)
+        self.log(f"Job {job_id} cancelled")
+        
+    def finish_job(self, job_id):
+        entry = self.jobs.pop(job_id)
+        self.cancel_button.setEnabled(bool(self.jobs))
+        return entry
+        
+    def closeEvent(self, event):
+        for job, _ in self.jobs.values():
+            job.cancel()
+        self.pool.waitForDone()
+        self.preview_pool.waitForDone()
+        super().closeEvent(event)
     
-    # Watermarking methods
-    def embed_lsb(self, host_path, watermark_path, output_path):
-        host_img = Image.open(host_path).convert('RGB')
-        watermark_img = Image.open(watermark_path).convert('L')  # Grayscale
-        
-        # Resize watermark to match host dimensions
-        watermark_img = watermark_img.resize(host_img.size)
-        
-        host_pixels = np.array(host_img)
-        watermark_pixels = np.array(watermark_img)
-        
-        # Normalize watermark to 0-1 
-        #MOre than 127 mean 1
-        #less than 127 mean 0
-        watermark_binary = (watermark_pixels > 127).astype(np.uint8)
-        # Embed in LSB of red channel
-        watermarked_pixels = host_pixels.copy()
-        watermarked_pixels[:, :, 0] = (host_pixels[:, :, 0] & ~1) | watermark_binary
-        
-        # Save result
-        Image.fromarray(watermarked_pixels).save(output_path)
+    # Watermarking methods; each returns ((width, height), stage seconds)
+    def run_embed(self, method, host_path, watermark_path, output_path, alpha, encoder,
+                  progress=None):
+        return method.embed(host_path, watermark_path, output_path, progress=progress,
+                            encoder=encoder, cache=self.watermark_cache, alpha=alpha)
     
-    def extract_lsb(self, watermarked_path, output_path):
-        watermarked_img = Image.open(watermarked_path).convert('RGB')
-        watermarked_pixels = np.array(watermarked_img)
-        
-        # Extract LSB from red channel
-        extracted_bits = (watermarked_pixels[:, :, 0] & 1) * 255    
-        extracted_img = Image.fromarray(extracted_bits.astype(np.uint8))
-        extracted_img.save(output_path)
+    def run_extract(self, method, watermarked_path, output_path, original_path, encoder,
+                    progress=None):
+        return method.extract(watermarked_path, output_path, original_path, progress=progress,
+                              encoder=encoder)
 
 def main():
     app = QApplication(sys.argv)